@@ -1 +1 @@
-from .numdf import Ptp, Density  # noqa F401
+from .numdf import Ptp, Density, Qdf, PartialCdf  # noqa F401
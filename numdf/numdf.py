@@ -6,12 +6,455 @@ if "sphinx" not in sys.modules:
     import resource as rs
     rs.setrlimit(rs.RLIMIT_STACK, (rs.RLIM_INFINITY, rs.RLIM_INFINITY))
 import os
-os.environ["OMP_NUM_THREADS"] = "1"
-import copy
+# Use a single OpenMP thread unless the user has set OMP_NUM_THREADS
+os.environ.setdefault("OMP_NUM_THREADS", "1")
 from typing import Callable
 import numpy as np
 from firedrake import *
 from firedrake.__future__ import interpolate
+import ufl
+
+
+def _indicator_projection(s, w, n_e):
+    """
+    Return the projection of the indicator I(y,s) onto DG1 summed over weighted samples.
+
+    For a sample s inside the element [y_e, y_e+1] with local coordinate
+    t = (s - y_e)/h the projection of I(y,s) has the DOFs
+
+        (1 - t)(1 - 3t), (1 - t)(1 + 3t)
+
+    while elements above (below) the sample receive 1 (0). Sorting the
+    samples once reduces the sum over all samples to prefix sums.
+
+    Parameters
+    ----------
+    s : array-like
+        Sample values with range [0,1].
+    w : array-like
+        Sample weights.
+    n_e : int
+        Number of elements of the unit interval.
+
+    Returns
+    -------
+    G : array-like
+        Array of shape (n_e, 2) holding the left and right DOFs of each element.
+    """
+    s = np.asarray(s, dtype=float).ravel()
+    w = np.asarray(w, dtype=float).ravel()
+    order = np.argsort(s, kind="stable")
+    s = s[order]
+    w = w[order]
+
+    # k[e] is the number of samples with s < y_e
+    k = np.searchsorted(s, np.linspace(0, 1, n_e + 1), side="left")
+    W = np.concatenate(([0.], np.cumsum(w)))
+
+    # Local coordinate of the samples within their element
+    e = np.repeat(np.arange(n_e), np.diff(k))
+    t = s[k[0]:k[-1]]*n_e - e
+    w_e = w[k[0]:k[-1]]*(1 - t)
+    K_0 = np.concatenate(([0.], np.cumsum(w_e*(1 - 3*t))))
+    K_1 = np.concatenate(([0.], np.cumsum(w_e*(1 + 3*t))))
+
+    G = np.empty((n_e, 2))
+    G[:, 0] = W[k[:-1]] + K_0[k[1:] - k[0]] - K_0[k[:-1] - k[0]]
+    G[:, 1] = W[k[:-1]] + K_1[k[1:] - k[0]] - K_1[k[:-1] - k[0]]
+
+    return G
+
+
+def _linear_density_projection(a, b, r_a, r_b, n_e):
+    """
+    Return the projection of I(y,s) onto DG1 integrated against piecewise linear densities.
+
+    Each piece is a density r(s) varying linearly from r_a at s = a to r_b
+    at s = b. Pieces are split at the element boundaries they span, the
+    product of the linear density & the quadratic kernel of
+    _indicator_projection is integrated exactly by Simpson's rule within
+    each element, and the mass of a piece adds 1 to the elements above it.
+
+    Parameters
+    ----------
+    a, b : array-like
+        End points a < b of the pieces with range [0,1].
+    r_a, r_b : array-like
+        Densities at the end points of the pieces.
+    n_e : int
+        Number of elements of the unit interval.
+
+    Returns
+    -------
+    G : array-like
+        Array of shape (n_e, 2) holding the left and right DOFs of each element.
+    """
+    a, b, r_a, r_b = (np.asarray(v, dtype=float).ravel() for v in (a, b, r_a, r_b))
+    a, b, r_a, r_b = a[b > a], b[b > a], r_a[b > a], r_b[b > a]
+
+    def r(s):
+        return r_a + (r_b - r_a)*(s - a)/(b - a)
+
+    # Mass below Ω_Y, which lies below every element
+    c = np.minimum(b, 0)
+    below = np.sum(np.where(a < 0, (c - a)*(r_a + r(c))/2, 0))
+
+    # Restrict the pieces to Ω_Y
+    a_c, b_c = np.clip(a, 0, 1), np.clip(b, 0, 1)
+    r_a, r_b = r(a_c), r(b_c)
+    keep = b_c > a_c
+    a, b, r_a, r_b = a_c[keep], b_c[keep], r_a[keep], r_b[keep]
+
+    # Split each piece at the element boundaries it spans
+    e_a = np.minimum(np.floor(a*n_e), n_e - 1).astype(int)
+    e_b = np.maximum(np.ceil(b*n_e).astype(int) - 1, e_a)
+    n_sub = e_b - e_a + 1
+    p = np.repeat(np.arange(len(a)), n_sub)
+    e = e_a[p] + np.arange(len(p)) - np.repeat(np.cumsum(n_sub) - n_sub, n_sub)
+
+    # Local coordinates t of the sub-pieces within their element
+    t_lo = np.maximum(a[p]*n_e, e) - e
+    t_hi = np.minimum(b[p]*n_e, e + 1) - e
+
+    def f(t):
+        rho = (r_a[p] + (r_b[p] - r_a[p])*((t + e)/n_e - a[p])/(b[p] - a[p]))/n_e
+        return rho*(1 - t)*(1 - 3*t), rho*(1 - t)*(1 + 3*t), rho
+
+    f_lo, f_mid, f_hi = f(t_lo), f((t_lo + t_hi)/2), f(t_hi)
+    G = np.empty((n_e, 2))
+    for i in range(2):
+        G[:, i] = np.bincount(e, (t_hi - t_lo)*(f_lo[i] + 4*f_mid[i] + f_hi[i])/6, minlength=n_e)
+    mass = np.bincount(e, (t_hi - t_lo)*(f_lo[2] + f_hi[2])/2, minlength=n_e)
+    G += (below + np.concatenate(([0.], np.cumsum(mass)[:-1])))[:, None]
+
+    return G
+
+
+def _grid_weights(kind, x):
+    """
+    Return the quadrature weights of the points x of a one dimensional spectral grid.
+
+    The interval of the grid is recovered from its points, so the points
+    may be in any order (e.g. as written by Dedalus) & the weights are
+    returned in the same order.
+
+    Parameters
+    ----------
+    kind : string
+        'fourier' for a uniform periodic grid, excluding the end point, which
+        uses the trapezoid rule, 'chebyshev' for the Gauss-Chebyshev (roots)
+        grid which uses Fejér's first rule, or 'clenshaw-curtis' for the
+        Chebyshev extrema grid which uses the Clenshaw-Curtis rule.
+    x : array-like
+        Points of the grid.
+
+    Returns
+    -------
+    w : array-like
+        Quadrature weights of the points x.
+    """
+    x = np.asarray(x, dtype=float).ravel()
+    N = len(x)
+    if N < 2:
+        raise ValueError('Each grid must have at least two points \n')
+    a, b = x.min(), x.max()
+
+    if kind == 'fourier':
+        return np.full(N, (b - a)/(N - 1))
+
+    if kind == 'chebyshev':
+        # The roots x_j = cos(θ_j) do not include the end points of the interval
+        h = (b - a)/(2*np.cos(np.pi/(2*N)))
+        k = np.arange(1, N//2 + 1)
+        theta = np.arccos(np.clip((2*x - a - b)/(2*h), -1, 1))
+        w = (2/N)*(1 - 2*np.sum(np.cos(2*np.outer(theta, k))/(4*k**2 - 1), axis=1))
+    elif kind == 'clenshaw-curtis':
+        h, n = (b - a)/2, N - 1
+        k = np.arange(1, n//2 + 1)
+        b_k = np.where(2*k == n, 1, 2)
+        theta = np.arccos(np.clip((2*x - a - b)/(2*h), -1, 1))
+        c = np.where(np.isclose(np.abs(np.cos(theta)), 1), 1, 2)
+        w = (c/n)*(1 - np.sum(b_k*np.cos(2*np.outer(theta, k))/(4*k**2 - 1), axis=1))
+    else:
+        raise ValueError('The grid must be fourier, chebyshev or clenshaw-curtis \n')
+
+    return w*h
+
+
+def _block_inverse(indptr, indices, data, offset=0):
+    """
+    Return the inverse blocks of a block diagonal matrix stored in CSR format.
+
+    For the mass matrix of a DG space each block couples the DOFs of a
+    single element, so these blocks can be found from the sparsity pattern.
+
+    Parameters
+    ----------
+    indptr, indices, data : array-like
+        CSR representation of the (locally owned) rows of the matrix,
+        with sorted column indices.
+    offset : int
+        Global index of the first owned row, which is subtracted from
+        the column indices so that they index the owned DOFs.
+
+    Returns
+    -------
+    nodes : array-like
+        Array of shape (n_blocks, k) holding the local DOFs of each block.
+    M_inv : array-like
+        Array of shape (n_blocks, k, k) holding the inverse of each block.
+    """
+    # A rank may own no rows
+    if len(indptr) == 1:
+        return np.empty((0, 0), dtype=int), np.empty((0, 0, 0))
+
+    nnz = np.diff(indptr)
+    k = nnz[0]
+    if np.any(nnz != k):
+        raise ValueError('Expected a block diagonal matrix with blocks of equal size \n')
+
+    cols = np.asarray(indices).reshape((-1, k)) - offset
+    if np.any(cols < 0) or np.any(cols >= len(nnz)):
+        raise ValueError('Expected a block diagonal matrix with blocks owned by a single rank \n')
+    nodes = np.unique(cols, axis=0)
+    if not np.array_equal(cols[nodes], np.broadcast_to(nodes[:, None, :], (len(nodes), k, k))):
+        raise ValueError('Expected a block diagonal matrix with blocks of equal size \n')
+    M = np.asarray(data).reshape((-1, k))[nodes]
+
+    return nodes, np.linalg.inv(M)
+
+
+def _limiter_jumps(celldata_n, celldata_0):
+    """
+    Return the jumps used by the slope limiter to correct each element.
+
+    Parameters
+    ----------
+    celldata_n : array-like
+        Left and right DOFs of the current cdf, of shape (n_e, 2).
+    celldata_0 : array-like
+        Left and right DOFs of the unlimited cdf, of shape (n_e, 2).
+
+    Returns
+    -------
+    jumps : array-like
+        The jump of each element.
+    """
+    def jump_condition(a_n_minus, a_n_plus, a_0_minus):
+        return np.where(a_n_plus < a_n_minus, a_n_plus - a_n_minus, np.minimum(a_n_plus, a_0_minus) - a_n_minus)
+
+    # (1) cell data, padded with F = 0 (F = 1) to the left (right)
+    # e - 1
+    cell_n_em1 = np.concatenate(([0.], celldata_n[:-1, 1]))
+    cell_0_em1 = np.concatenate(([0.], celldata_0[:-1, 1]))
+    # e + 1
+    cell_n_ep1 = np.concatenate((celldata_n[1:, 0], [1.]))
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    # (2) jumps
+    left = jump_condition(cell_n_em1, celldata_n[:, 0], cell_0_em1)
+    right = jump_condition(celldata_n[:, 1], cell_n_ep1, celldata_0[:, 1])
+    # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    return np.minimum(left, right)
+
+
+def _pool_adjacent_violators(m):
+    """
+    Return the non-decreasing sequence closest to m in the least squares sense.
+
+    Parameters
+    ----------
+    m : array-like
+        Sequence of equally weighted values.
+
+    Returns
+    -------
+    m_iso : array-like
+        The isotonic regression of m.
+    """
+    m = np.asarray(m, dtype=float).ravel()
+
+    # Stack of blocks, of at most len(m), held in preallocated arrays
+    sums = np.empty(len(m))
+    counts = np.empty(len(m), dtype=int)
+    top = -1
+    for m_i in m:
+        top += 1
+        sums[top] = m_i
+        counts[top] = 1
+        # Pool the last two blocks until the sequence of block means is non-decreasing
+        while top > 0 and sums[top - 1]*counts[top] > sums[top]*counts[top - 1]:
+            sums[top - 1] += sums[top]
+            counts[top - 1] += counts[top]
+            top -= 1
+
+    return np.repeat(sums[:top + 1]/counts[:top + 1], counts[:top + 1])
+
+
+def _compose_piecewise_linear(p, q, a, b):
+    """
+    Return the projection onto DG1 of f(g(y)) for piecewise linear f and g.
+
+    In each element g(ξ) = a + (b - a)ξ is linear, so f(g(ξ)) is linear
+    between the points ξ where g crosses a breakpoint of f. The projection
+    is then integrated exactly using Simpson's rule on each of these pieces.
+
+    Parameters
+    ----------
+    p, q : array-like
+        Non-decreasing breakpoints p_i and values f(p_i) of f.
+    a, b : array-like
+        Values of g at the left and right DOF of each element.
+
+    Returns
+    -------
+    fg : array-like
+        Array of shape (n, 2) holding the left and right DOFs of each element.
+    """
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    n = len(a)
+
+    # (1) Breakpoints of f strictly inside the range of g in each element
+    lo = np.searchsorted(p, np.minimum(a, b), side="right")
+    hi = np.searchsorted(p, np.maximum(a, b), side="left")
+    counts = np.maximum(hi - lo, 0)
+    cell = np.repeat(np.arange(n), counts)
+    indx = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(lo, counts)
+
+    # (2) Merge them with the element end points & sort within each element
+    cells = np.concatenate((np.arange(n), np.arange(n), cell))
+    xi = np.concatenate((np.zeros(n), np.ones(n), (p[indx] - a[cell])/(b[cell] - a[cell])))
+    order = np.lexsort((xi, cells))
+    cells = cells[order]
+    xi = xi[order]
+
+    # (3) Pieces between consecutive points of the same element
+    same = cells[:-1] == cells[1:]
+    e = cells[:-1][same]
+    xi_l = xi[:-1][same]
+    xi_r = xi[1:][same]
+    xi_m = (xi_l + xi_r)/2
+
+    # Linear piece j of f containing each piece, f is constant outside [p_0, p_n]
+    g_m = a[e] + (b[e] - a[e])*xi_m
+    j = np.clip(np.searchsorted(p, g_m, side="right") - 1, 0, len(p) - 2)
+    dp = p[j + 1] - p[j]
+
+    def f(xi):
+        g = a[e] + (b[e] - a[e])*xi
+        theta = np.divide(g - p[j], dp, out=np.ones_like(dp), where=dp > 0)
+        theta = np.clip(theta, 0, 1)
+        return (1 - theta)*q[j] + theta*q[j + 1]
+
+    f_l, f_m, f_r = f(xi_l), f(xi_m), f(xi_r)
+    w = (xi_r - xi_l)/6
+    b_0 = np.bincount(e, w*(f_l*(1 - xi_l) + 4*f_m*(1 - xi_m) + f_r*(1 - xi_r)), minlength=n)
+    b_1 = np.bincount(e, w*(f_l*xi_l + 4*f_m*xi_m + f_r*xi_r), minlength=n)
+
+    # (4) Apply the inverse of the reference element mass matrix
+    fg = np.empty((n, 2))
+    fg[:, 0] = 4*b_0 - 2*b_1
+    fg[:, 1] = -2*b_0 + 4*b_1
+
+    return fg
+
+
+class Qdf(object):
+    """
+    Qdf class containing the qdf Q(p) of a function Y(X).
+
+    Q(p) is continuous and piecewise linear with breakpoints p_i given by
+    the DOFs of the cdf F(y), and is stored as the arrays of breakpoints p_i
+    and values Q(p_i). It is evaluated with NumPy and only becomes a firedrake
+    Function, on a mesh whose vertices are the p_i, when this is requested.
+
+    Examples
+    --------
+    Evaluate the QDF at a set of points::
+
+        >>> density.qdf(np.linspace(0, 1, 100))
+
+    Return the QDF as a firedrake Function::
+
+        >>> Q = density.qdf.function()
+
+    """
+
+    def __init__(self, p, y, comm=COMM_WORLD):
+        """
+        Initialise the Qdf object.
+
+        Parameters
+        ----------
+        p : array-like
+            Non-decreasing breakpoints p_i in [0,1].
+        y : array-like
+            Values Q(p_i) at the breakpoints.
+        comm : MPI communicator
+            Communicator of the mesh created by function().
+        """
+        self.p = np.asarray(p, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.comm = comm
+        self._function = None
+
+        return None
+
+    def __call__(self, p):
+        """
+        Return Q(p) at the point(s) p.
+
+        Where Q(p) is discontinuous, i.e. p_i = p_i+1, the value to the right
+        is returned.
+
+        Parameters
+        ----------
+        p : array-like
+            Point(s) in [0,1] to evaluate at.
+
+        Returns
+        -------
+        qdf_at_p : array-like
+            Q evaluated on p.
+        """
+        p_ = np.asarray(p, dtype=float)
+        i = np.clip(np.searchsorted(self.p, p_, side="right") - 1, 0, len(self.p) - 2)
+
+        dp = self.p[i + 1] - self.p[i]
+        theta = np.divide(p_ - self.p[i], dp, out=np.ones_like(dp), where=dp > 0)
+        theta = np.clip(theta, 0, 1)
+        qdf_at_p = (1 - theta)*self.y[i] + theta*self.y[i + 1]
+
+        if np.ndim(p) == 0:
+            return float(qdf_at_p)
+        return qdf_at_p
+
+    def at(self, p):
+        """Return Q(p) at the point(s) p, as for a firedrake Function."""
+        return self(p)
+
+    def function(self):
+        """
+        Return Q(p) as a firedrake Function.
+
+        Returns
+        -------
+        Q : firedrake Function
+            Q(p) in the space CG1 on a mesh whose vertices are the p_i.
+        """
+        if self._function is None:
+            # Make a 1D mesh whose vertices are given by the p values
+            m_p = UnitIntervalMesh(ncells=len(self.p) - 1, comm=self.comm)
+            m_p.coordinates.dat.data[:] = self.p[:]
+
+            # Create a function Q(p) on this mesh & assign Q(p_i) = y_i
+            V_Q = FunctionSpace(mesh=m_p, family="CG", degree=1)
+            self._function = Function(V_Q)
+            self._function.dat.data[:] = self.y[:]
+
+        return self._function
 
 
 class Density(object):
@@ -47,8 +490,10 @@ class Density(object):
         ----------
         ptp : Ptp
             Ptp object corresponding to Y(X).
-        y,cdf,qdf,pdf : firedrake Function
+        y,cdf,pdf : firedrake Function
             Firedrake functions generated by Ptp corresponding to Y(X).
+        qdf : Qdf
+            Piecewise linear qdf generated by Ptp corresponding to Y(X).
         """
         self.ptp = ptp
         self.y = y
@@ -58,22 +503,94 @@ class Density(object):
 
         return None
 
+    def to_arrays(self):
+        """
+        Return a compact representation of the density as NumPy arrays.
+
+        Returns
+        -------
+        arrays : dict
+            The DOFs of the 'cdf', 'fc' & 'fs' and the breakpoints 'p' &
+            values 'q' of the qdf.
+        """
+        return {'cdf': self.cdf.dat.data_ro.copy(),
+                'fc': self.pdf["fc"].dat.data_ro.copy(),
+                'fs': self.pdf["fs"].dat.data_ro.copy(),
+                'p': self.qdf.p.copy(),
+                'q': self.qdf.y.copy()}
+
+    @classmethod
+    def from_arrays(cls, ptp, arrays):
+        """
+        Return the Density object corresponding to the arrays of to_arrays.
+
+        Parameters
+        ----------
+        ptp : Ptp
+            Ptp object with the same number of elements as that which
+            generated the arrays.
+        arrays : dict
+            Compact representation of the density returned by to_arrays.
+
+        Returns
+        -------
+        density : class 'Density'
+            A Density object containing the CDF, QDF & PDF.
+        """
+        F = Function(ptp.V_F)
+        F.dat.data[:] = arrays['cdf']
+        fc = Function(ptp.V_fc)
+        fc.dat.data[:] = arrays['fc']
+        fs = Function(ptp.V_fs)
+        fs.dat.data[:] = arrays['fs']
+        Q = Qdf(arrays['p'], arrays['q'], comm=ptp.m_y.comm)
+
+        return cls(ptp, ptp.y_coord(), F, Q, {"fc": fc, "fs": fs})
+
+    def __getstate__(self):
+        """Return the picklable state of the density."""
+        return {'ptp': self.ptp, 'arrays': self.to_arrays()}
+
+    def __setstate__(self, state):
+        """Restore the density from its pickled state."""
+        self.__dict__.update(Density.from_arrays(state['ptp'], state['arrays']).__dict__)
+
     def compose(self, f, g, quadrature_degree):
         """
         Return the projection of the function composition 
         f o g(y) = f(g(y)) 
         into the space of test functions.
 
+        If f is a Qdf and g a DG1 function such as the cdf, f o g is
+        piecewise linear and its projection is computed exactly, in which
+        case the quadrature degree is not used.
+
         Parameters
         ----------
-        f,g : firedrake Function
+        f,g : firedrake Function or Qdf
             Input functions to compose.
+        quadrature_degree : int
+            Quadrature degree used to evaluate f o g in general.
 
         Returns
         -------
         f(g(y)) : firedrake Function
             Composition projected into the space DG1
         """
+        if isinstance(f, Qdf) and not isinstance(g, Qdf):
+            V_g = g.function_space()
+            if V_g.ufl_element() == self.ptp.V_F.ufl_element():
+                nodes = V_g.cell_node_map().values
+                g_i = g.dat.data_ro
+                fg = Function(V_g)
+                fg.dat.data[nodes] = _compose_piecewise_linear(f.p, f.y, g_i[nodes[:, 0]], g_i[nodes[:, 1]])
+                return fg
+
+        if isinstance(f, Qdf):
+            f = f.function()
+        if isinstance(g, Qdf):
+            g = g.function()
+
         mesh_g = g.function_space().mesh()
         mesh_f = f.function_space().mesh()
 
@@ -143,7 +660,7 @@ class Density(object):
         elif function == 'QDF':
 
             try:
-                plot(self.qdf, num_sample_points=50)
+                plt.plot(self.qdf.p, self.qdf.y)
                 plt.title(r'QDF', fontsize=20)
                 plt.ylabel(r'$Q_Y$', fontsize=20)
                 plt.xlabel(r'$p$', fontsize=20)
@@ -179,26 +696,53 @@ class Density(object):
                 warning("Cannot plot figure. Error msg: '%s'" % e)
         return None
 
-    def evaluate(self, y):
+    def evaluate(self, y, functions=('cdf', 'qdf', 'pdf')):
         """
         Return the CDF, QDF and PDF at the point(s) y.
+
+        As the mesh of the CDF & PDF is uniform the element containing each
+        point is found directly from its coordinate, so no point location
+        is required. At a vertex of the mesh, where the CDF & PDF may be
+        discontinuous, the element to its right is used so that both are
+        right-continuous, except at the right end point of Ω_Y.
         
         Parameters
         ----------
         y : array-like
             A grid to evaluate on.
+        functions : tuple of strings
+            The functions to evaluate, any of 'cdf', 'qdf' and 'pdf'.
 
         Returns
         -------
         cdf_at_y,qdf_at_y,pdf_at_y : array-like
-            cdf,qdf,pdf evaluated on y.
+            cdf,qdf,pdf evaluated on y, in the order given by functions.
         """
-        
-        cdf_at_y = np.asarray(self.cdf.at(y))
-        qdf_at_y = np.asarray(self.qdf.at(y))
-        pdf_at_y = np.asarray(self.pdf["fc"].at(y))
-
-        return cdf_at_y, qdf_at_y, pdf_at_y
+        if isinstance(functions, str):
+            functions = (functions,)
+
+        y = np.asarray(y, dtype=float)
+        y_l, y_r = self.ptp.Omega_Y['Y']
+        n_e = self.ptp.n_e
+
+        # Element e containing y & local coordinate ξ
+        if 'cdf' in functions or 'pdf' in functions:
+            s = n_e*(y - y_l)/(y_r - y_l)
+            if np.any(s < -1e-12) or np.any(s > n_e*(1 + 1e-12)):
+                raise ValueError('The point(s) y must lie in Ω_Y \n')
+            e = np.clip(np.floor(s).astype(int), 0, n_e - 1)
+            xi = np.clip(s - e, 0, 1)
+
+        values = {}
+        if 'cdf' in functions:
+            celldata = self.cdf.dat.data_ro.reshape((-1, 2))
+            values['cdf'] = (1 - xi)*celldata[e, 0] + xi*celldata[e, 1]
+        if 'qdf' in functions:
+            values['qdf'] = np.asarray(self.qdf(y))
+        if 'pdf' in functions:
+            values['pdf'] = self.pdf["fc"].dat.data_ro[e]
+
+        return tuple(values[function] for function in functions)
 
     def __call__(self, g):
         """
@@ -222,10 +766,166 @@ class Density(object):
         integral : float
             The integral int g(y) dF(y)
         """
+        return self.integrate([g])[0]
+
+    def integrate(self, g_list, quadrature_degree=10):
+        """
+        Given a list of test functions g_k(y) evaluate
+            
+            int g_k(y) dF(y) := <g_k,f_c> + <g_k,f_s>
 
+        for each of them in a single pass.
+
+        UFL test functions are integrated together by assembling a single
+        form whose test functions are in a vector valued real space, so only
+        one form is compiled & assembled for the whole list. Python callables
+        are evaluated with NumPy at the Gauss points of each element and at
+        the element facets.
+
+        Parameters
+        ----------
+        g_list : list of Firedrake functions, UFL expressions or callables
+            Valid test functions, where a callable returns g(y_i) at the
+            points y_i of an array.
+        quadrature_degree : int
+            Quadrature degree used to integrate callables within each element.
+
+        Returns
+        -------
+        integrals : array-like
+            The integrals int g_k(y) dF(y) in the order of g_list.
+        """
         fc = self.pdf["fc"]
         fs = self.pdf["fs"]
-        return assemble(g*fc*dx) + assemble(avg(g)*fs*dS + g*fs*ds)
+        integrals = np.zeros(len(g_list))
+
+        is_ufl = [isinstance(g, ufl.core.expr.Expr) or not callable(g) for g in g_list]
+        k_ufl = [k for k, is_ufl_k in enumerate(is_ufl) if is_ufl_k]
+        k_numpy = [k for k, is_ufl_k in enumerate(is_ufl) if not is_ufl_k]
+
+        # (1) UFL test functions
+        if k_ufl:
+            G = as_vector([g_list[k] for k in k_ufl])
+            V_R = VectorFunctionSpace(fc.function_space().mesh(), "R", 0, dim=len(k_ufl))
+            v = TestFunction(V_R)
+            L = inner(G, v)*fc*dx + inner(avg(G), avg(v))*fs*dS + inner(G, v)*fs*ds
+            integrals[k_ufl] = assemble(L).dat.data_ro.ravel()
+
+        # (2) Callables
+        if k_numpy:
+            y_l, y_r = self.ptp.Omega_Y['Y']
+            n_e = self.ptp.n_e
+            h = (y_r - y_l)/n_e
+            y_v = np.linspace(y_l, y_r, n_e + 1)
+
+            # Gauss points within each element
+            xi, w = np.polynomial.legendre.leggauss(quadrature_degree//2 + 1)
+            y_q = y_v[:-1, None] + h*(xi[None, :] + 1)/2
+            w_q = (h*w/2)[None, :]*fc.dat.data_ro[:, None]
+
+            # Dirac measures at the element facets in ascending order
+            fs_v = fs.dat.data_ro[self.ptp._fs_indx]
+
+            for k in k_numpy:
+                integrals[k] = np.sum(w_q*g_list[k](y_q)) + np.sum(fs_v*g_list[k](y_v))
+
+        return integrals
+
+    def stats(self, order=4, quantiles=(0.25, 0.5, 0.75)):
+        """
+        Return summary statistics of Y(X) computed in closed form.
+
+        As f_c is piecewise constant and f_s consists of Dirac measures at
+        the element facets, the moments of the density are sums over their
+        DOFs. The entropy is that of the continuous part f_c of the density.
+
+        Parameters
+        ----------
+        order : int
+            Highest order of the moments to return.
+        quantiles : array-like
+            Probabilities p at which to return the quantiles Q(p).
+
+        Returns
+        -------
+        stats : dict
+            Dictionary with the 'mean', 'variance', 'entropy', the raw
+            'moments' & 'central_moments' of order 0 to order, and the
+            'quantiles'.
+        """
+        y_l, y_r = self.ptp.Omega_Y['Y']
+        n_e = self.ptp.n_e
+        h = (y_r - y_l)/n_e
+        y_v = np.linspace(y_l, y_r, n_e + 1)
+
+        fc = self.pdf["fc"].dat.data_ro
+        fs = self.pdf["fs"].dat.data_ro[self.ptp._fs_indx]
+
+        def moment(k, c):
+            # int (y - c)^k dF(y) = <(y - c)^k, f_c> + <(y - c)^k, f_s>
+            z = (y_v - c)**(k + 1)/(k + 1)
+            return np.sum(fc*(z[1:] - z[:-1])) + np.sum(fs*(y_v - c)**k)
+
+        moments = np.array([moment(k, 0) for k in range(order + 1)])
+        mean = moment(1, 0)
+        central_moments = np.array([moment(k, mean) for k in range(order + 1)])
+
+        positive = fc > 0
+        entropy = -h*np.sum(fc[positive]*np.log(fc[positive]))
+
+        return {'mean': mean,
+                'variance': moment(2, mean),
+                'entropy': entropy,
+                'moments': moments,
+                'central_moments': central_moments,
+                'quantiles': self.qdf(np.asarray(quantiles, dtype=float))}
+
+
+class PartialCdf(object):
+    """
+    Unnormalised projection of I(y,X) onto V_F over part of Ω_X.
+
+    Partial cdfs of disjoint parts of Ω_X, or of members of an ensemble,
+    are combined by addition, which is associative & commutative, and
+    converted into a Density by Ptp.finalise.
+
+    Attributes
+    ----------
+    G : array-like
+        Projection of I(y,X) onto V_F times the measure, ordered by ascending y.
+    measure : float
+        Measure of the part of Ω_X.
+    """
+
+    def __init__(self, G, measure):
+        """
+        Initialise the PartialCdf object.
+
+        Parameters
+        ----------
+        G : array-like
+            Projection of I(y,X) onto V_F times the measure, ordered by ascending y.
+        measure : float
+            Measure of the part of Ω_X.
+        """
+        self.G = np.asarray(G, dtype=float)
+        self.measure = float(measure)
+
+        return None
+
+    def __add__(self, other):
+        """Return the sum of two partial cdfs."""
+        if not isinstance(other, PartialCdf):
+            return NotImplemented
+        if self.G.shape != other.G.shape:
+            raise ValueError('The partial cdfs must have the same number of elements \n')
+        return PartialCdf(self.G + other.G, self.measure + other.measure)
+
+    def __radd__(self, other):
+        """Return the sum of two partial cdfs, allowing sum() to be used."""
+        if other == 0:
+            return self
+        return self.__add__(other)
 
 
 class Ptp(object):
@@ -251,6 +951,13 @@ class Ptp(object):
         Range of the function Y(X).
     n_elements : int
         Number of finite elements.
+    limiter : string
+        Limiter used to enforce a non-decreasing CDF, either 'relaxation'
+        or 'isotonic'.
+    n_cells : int or tuple
+        Number of cells of the physical mesh along each axis of Ω_X.
+    comm : MPI communicator
+        Communicator over which Ω_X is distributed, see __init__.
 
     Returns
     -------
@@ -271,7 +978,7 @@ class Ptp(object):
   
     """
 
-    def __init__(self, Omega_X={'x1': (-1, 1), 'x2': (-1, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=10):
+    def __init__(self, Omega_X={'x1': (-1, 1), 'x2': (-1, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=10, limiter='relaxation', n_cells=1, comm=None):
         """
         Intialise the Ptp object.
         
@@ -283,26 +990,54 @@ class Ptp(object):
             Range of the function Y(X).
         n_elements : int
             Number of finite elements.
+        limiter : string
+            Limiter used to enforce a non-decreasing CDF, either 'relaxation'
+            or 'isotonic'.
+        n_cells : int or tuple
+            Number of cells (nx, ny) of the physical mesh along each axis
+            of Ω_X. Refining the physical mesh resolves the structure of
+            Y(X) with a lower quadrature degree in each cell.
+        comm : MPI communicator
+            If given, each rank of comm holds the slab Omega_X of the physical
+            domain. The meshes of each rank are then local (COMM_SELF) and
+            the projection of I(y,X) is summed over the ranks, such that every
+            rank returns the density of Y(X) over the union of the slabs.
+            Otherwise the physical mesh m_x & the extruded mesh m_yx are
+            distributed over COMM_WORLD, while the y-space mesh m_y of n_e
+            cells is held whole by every rank.
         """
         # Physical space
         self.Omega_X = Omega_X
         self.Omega_Y = Omega_Y
         self.n_e = n_elements
 
+        if limiter not in ('relaxation', 'isotonic'):
+            raise ValueError('The limiter must be relaxation or isotonic \n')
+        self.limiter = limiter
+
+        # Arguments used to re-create the Ptp, e.g. on worker processes
+        self._args = {'Omega_X': Omega_X, 'Omega_Y': Omega_Y, 'n_elements': n_elements, 'limiter': limiter, 'n_cells': n_cells}
+
+        # In MPI mode each rank holds its own meshes
+        self.comm = comm
+        mesh_comm = COMM_WORLD if comm is None else COMM_SELF
+
         # Mesh & Coordinates
+        self.n_cells = tuple(np.broadcast_to(n_cells, len(self.Omega_X)))
         if len(self.Omega_X) == 1:
             self.cell_type = "interval"
             self.cell_type = "interval"
-            mesh_x = IntervalMesh(ncells=1, length_or_left=self.Omega_X['x1'][0], right=self.Omega_X['x1'][1])
+            self.m_x = IntervalMesh(ncells=self.n_cells[0], length_or_left=self.Omega_X['x1'][0], right=self.Omega_X['x1'][1], comm=mesh_comm)
         elif len(self.Omega_X) == 2:
             self.cell_type = "quadrilateral"
             self.cell_type = "quadrilateral"
-            mesh_x = RectangleMesh(nx=1, ny=1, Lx=self.Omega_X['x1'][1], Ly=self.Omega_X['x2'][1], originX=self.Omega_X['x1'][0], originY=self.Omega_X['x2'][0], quadrilateral=True)
+            self.m_x = RectangleMesh(nx=self.n_cells[0], ny=self.n_cells[1], Lx=self.Omega_X['x1'][1], Ly=self.Omega_X['x2'][1], originX=self.Omega_X['x1'][0], originY=self.Omega_X['x2'][0], quadrilateral=True, comm=mesh_comm)
         else:
             raise ValueError('The domain Ω must be 1D or 2D \n')
 
-        self.m_y = IntervalMesh(ncells=self.n_e, length_or_left=self.Omega_Y['Y'][0], right=self.Omega_Y['Y'][1])
-        self.m_yx = ExtrudedMesh(mesh_x, layers=self.n_e, layer_height=1./self.n_e, extrusion_type='uniform')
+        # Only the n_e sized y-space result is communicated, so m_y is never distributed
+        self.m_y = IntervalMesh(ncells=self.n_e, length_or_left=self.Omega_Y['Y'][0], right=self.Omega_Y['Y'][1], comm=COMM_SELF)
+        self.m_yx = ExtrudedMesh(self.m_x, layers=self.n_e, layer_height=1./self.n_e, extrusion_type='uniform')
 
         # Finite-Element
         self.R_FE = FiniteElement(family="DG", cell=self.cell_type, degree=0, variant="equispaced")
@@ -319,6 +1054,63 @@ class Ptp(object):
         self.V_fc = FunctionSpace(mesh=self.m_y, family=self.V_fc)
         self.V_fs = FunctionSpace(mesh=self.m_y, family=self.V_fs)
 
+        # Sort a linear function in ascending order
+        # this creates a DOF map which matches
+        # the extended mesh which are in ascending order
+        ys = assemble(interpolate(self.y_coord(), self.V_F))
+        self._F_indx = np.argsort(ys.dat.data_ro, kind="stable")
+
+        # Sort the vertices in ascending order, this creates a DOF map for V_fs
+        self._fs_indx = np.argsort(self.m_y.coordinates.dat.data_ro.ravel(), kind="stable")
+
+        # Quadrature points & weights along each axis of Ω_X for each quadrature degree
+        self._quadrature = {}
+
+        # Quadrature spaces & weights on m_x, or the mesh of a Function, for each quadrature degree
+        self._physical_quadrature = {}
+
+        # DOFs of V_F_hat in each column of cells of m_yx ordered by ascending y
+        cell_node_map = self.V_F_hat.cell_node_map()
+        layers = np.arange(self.n_e)[None, :, None]*cell_node_map.offset[None, None, :]
+        self._F_hat_columns = cell_node_map.values[:, None, :] + layers
+
+        # Inverse mass matrix blocks, built on first use and reused by every fit
+        self._inverse_blocks = {}
+
+    def _local_solve(self, space, b):
+        """
+        Apply the inverse mass matrix of a discontinuous space to b element by element.
+
+        As the space is discontinuous its mass matrix is block diagonal.
+        The inverse of each block is computed once and then applied
+        directly to the right-hand side without a global solve. It is
+        used for V_F_hat, the PDF being computed in closed form.
+
+        Parameters
+        ----------
+        space : string
+            The function space, e.g. 'F_hat' for V_F_hat.
+        b : array-like
+            DOFs of the assembled right-hand side owned by this rank.
+
+        Returns
+        -------
+        x : array-like
+            DOFs of the solution owned by this rank.
+        """
+        if space not in self._inverse_blocks:
+            V = getattr(self, "V_" + space)
+            a = inner(TrialFunction(V), TestFunction(V))*dx
+            A = assemble(a, mat_type="aij").petscmat
+            # The column indices are global, while b only holds the owned DOFs
+            self._inverse_blocks[space] = _block_inverse(*A.getValuesCSR(), offset=A.getOwnershipRange()[0])
+
+        nodes, M_inv = self._inverse_blocks[space]
+        x = np.empty_like(b)
+        x[nodes] = np.einsum("eij,ej->ei", M_inv, b[nodes])
+
+        return x
+
     def y_coord(self):
         """Return the y coordinate on the interval mesh."""
         return SpatialCoordinate(self.m_y)[0]
@@ -372,56 +1164,344 @@ class Ptp(object):
             _, _, y = self.xy_coords()
         return conditional(Y < y, 1, 0)
 
-    def _cdf(self, Y, quadrature_degree):
+    def _partial_cdf(self, Y, quadrature_degree, y_quadrature_degree=None):
         """
-        Return the cdf F(y) of the random function Y(X).
-        
+        Return the unnormalised projection of I(y,X) for a UFL expression Y(X).
+
+        By default the projection is evaluated exactly in y, as for samples,
+        from the values of Y(X) at the quadrature points of the physical
+        mesh m_x. Otherwise, or if Y(X) contains a Function on m_yx which
+        cannot be evaluated on m_x, the form is assembled on the extruded
+        mesh m_yx with independent quadrature degrees in X and y.
+
         Parameters
         ----------
         Y : UFL expression
             A UFL expression Y(X) terms of x_coords() with range [0,1].
         quadrature_degree : int
-            Quadrature degree used to evaluate the projection of I(y,X).
-        
+            Quadrature degree in X used to evaluate the projection of I(y,X).
+        y_quadrature_degree : int
+            Quadrature degree in y, if None the projection is exact in y
+            or for a Y(X) on m_yx defaults to quadrature_degree.
+
         Returns
         -------
-        F : firedrake Function
-            The cdf F(y) of the random function Y(X).
+        partial : class 'PartialCdf'
+            The projection of I(y,X) over Ω_X & the measure of Ω_X.
         """
-        # Define trial & test functions on V_F_hat
-        u = TrialFunction(self.V_F_hat)
+        # Coefficients on m_yx are not replaced by _physical_samples
+        if y_quadrature_degree is None and any(c.function_space().mesh() is self.m_yx
+                                               for c in ufl.algorithms.extract_coefficients(Y)):
+            y_quadrature_degree = quadrature_degree
+
+        # The cells of m_x may be distributed over the ranks of its communicator
+        if y_quadrature_degree is None:
+            partial = self._partial_cdf_samples(*self._physical_samples(Y, quadrature_degree))
+            return self._allreduce(partial, self.m_x.comm)
+
+        # Define the test function on V_F_hat
         v = TestFunction(self.V_F_hat)
 
-        # Construct the linear & bilinear forms
-        a = inner(u, v) * dx
-        L = inner(self.indicator(Y), v) * dx(degree=quadrature_degree, scheme="default", domain=self.m_yx)
+        # Construct the linear form
+        degree = (quadrature_degree, y_quadrature_degree)
+        L = inner(self.indicator(Y), v) * dx(degree=degree, scheme="default", domain=self.m_yx)
 
         # Solve for F_hat
-        F_hat = Function(self.V_F_hat)
-        solve(a == L, F_hat)
-        # Recover F_Y(y) in V_F
-        F = Function(self.V_F)
+        F_hat = self._local_solve("F_hat", assemble(L).dat.data_ro)
 
-        # Sort a linear function in ascending order
-        # this creates a DOF map which matches
-        # the extended mesh which are in ascending order
-        y = self.y_coord()
-        ys = assemble(interpolate(y, self.V_F))
-        indx = np.argsort(ys.dat.data)
+        # Sum the projection in each (owned) column of cells of the uniform m_x
+        # weighted by the cell measure, then over the ranks of m_x
+        cell_measure = np.prod([b - a for a, b in self.Omega_X.values()])/np.prod(self.n_cells)
+        G = cell_measure*F_hat[self._F_hat_columns].sum(axis=0).ravel()
+        partial = PartialCdf(G, cell_measure*len(self._F_hat_columns))
 
-        # Pass F_hat into F
-        F.dat.data[indx] = F_hat.dat.data[:]
+        return self._allreduce(partial, self.m_x.comm)
 
-        # If the CDF is constant i.e F(y) = const do nothing otherwise
-        # apply the boundary conditions by extending the endpoints to 0,1
-        if np.allclose(F.dat.data[:], F.dat.data[0]) is False:
-            F.dat.data[0] = 0  # left end point
-            F.dat.data[-1] = 1  # right end point
+    def _physical_samples(self, Y, quadrature_degree):
+        """
+        Return the values and weights of Y(X) at the quadrature points of m_x.
 
-        # Apply a slope limiter to F
-        F = self.slope_limiter(F)
+        As Y(X) does not depend on y the coordinates of the extruded mesh
+        m_yx are replaced by those of m_x, so Y(X) is evaluated once per
+        point of m_x rather than once per layer of m_yx.
 
-        # Re-enforce
+        Parameters
+        ----------
+        Y : UFL expression
+            A UFL expression Y(X) terms of x_coords().
+        quadrature_degree : int
+            Order of the quadrature scheme to use.
+
+        Returns
+        -------
+        Y_q, w_q : array-like
+            Values Y(x_q) and quadrature weights w_q.
+        """
+        V_Y, w_q = self._mesh_quadrature(self.m_x, quadrature_degree)
+
+        X = SpatialCoordinate(self.m_x)
+        x = as_vector([X[i] for i in range(self.m_x.geometric_dimension())] + [0])
+        Y_x = ufl.replace(Y, {self.xy_coords(): x})
+
+        return assemble(interpolate(Y_x, V_Y)).dat.data_ro, w_q
+
+    def _partial_cdf_function(self, Y, mesh, quadrature_degree):
+        """
+        Return the unnormalised projection of I(y,X) for a Function Y(X) on its own mesh.
+
+        Y(X) is interpolated into a quadrature space on its mesh, so each
+        rank only evaluates its own cells, & the n_e sized projection and
+        measure are then summed over the communicator of the mesh.
+
+        Parameters
+        ----------
+        Y : UFL expression
+            An expression of a Function on mesh with range [0,1].
+        mesh : firedrake Mesh
+            The mesh of the Function.
+        quadrature_degree : int
+            Quadrature degree used to evaluate the projection of I(y,X).
+
+        Returns
+        -------
+        partial : class 'PartialCdf'
+            The projection of I(y,X) over the mesh & the measure of the mesh.
+        """
+        V_Y, w_q = self._mesh_quadrature(mesh, quadrature_degree)
+        Y_q = assemble(interpolate(Y, V_Y)).dat.data_ro
+
+        return self._allreduce(self._partial_cdf_samples(Y_q, w_q), mesh.comm)
+
+    def _partial_cdf_linear(self, Y, n_slices=10):
+        """
+        Return the projection of I(y,X) for a P1 or Q1 Function Y(X) on its own mesh.
+
+        As a P1 Function is linear in each interval or triangle, the measure
+        of {Y < y} within a cell has a piecewise linear density in y, and
+        the contributions of the cells are projected exactly. A Q1 Function
+        is not linear, so each quadrilateral is cut into n_slices
+        Gauss-Legendre slices across the reference direction in which Y(X)
+        varies most. Along a slice Y(X) & the Jacobian are linear, so each
+        slice is projected exactly, while the sum over the slices is a
+        quadrature whose error decreases with n_slices.
+
+        Parameters
+        ----------
+        Y : firedrake Function
+            A P1 or Q1 Function with range Ω_Y.
+        n_slices : int
+            Number of slices of each quadrilateral.
+
+        Returns
+        -------
+        partial : class 'PartialCdf'
+            The projection of I(y,X) over the mesh & the measure of the mesh.
+        """
+        V = Y.function_space()
+        mesh = V.mesh()
+        cell = mesh.ufl_cell().cellname()
+
+        # Values & coordinates at the vertices of each (owned) cell
+        Y_c = self.map(Y.dat.data_ro_with_halos[V.cell_node_map().values])
+        V_X = mesh.coordinates.function_space()
+        X_c = mesh.coordinates.dat.data_ro_with_halos[V_X.cell_node_map().values].reshape(Y_c.shape + (-1,))
+
+        if cell == "interval":
+            a, b = Y_c.min(axis=1), Y_c.max(axis=1)
+            r = np.abs(X_c[:, 1, 0] - X_c[:, 0, 0])/np.maximum(b - a, 1e-300)
+            pieces = [(a, b, r, r)]
+            mass = np.abs(X_c[:, 1, 0] - X_c[:, 0, 0])
+        elif cell == "triangle":
+            d_1, d_2 = X_c[:, 1] - X_c[:, 0], X_c[:, 2] - X_c[:, 0]
+            mass = np.abs(d_1[:, 0]*d_2[:, 1] - d_1[:, 1]*d_2[:, 0])/2
+            v = np.sort(Y_c, axis=1)
+            a = v[:, 0]
+            h = 2*mass/np.maximum(v[:, 2] - a, 1e-300)
+            pieces = [(a, v[:, 1], np.zeros_like(h), h), (v[:, 1], v[:, 2], h, np.zeros_like(h))]
+        elif cell == "quadrilateral":
+            # Vertices are ordered (ξ1, ξ2) = (0,0), (0,1), (1,0), (1,1)
+            Y_c = Y_c.reshape((-1, 2, 2, 1))
+            X_c = X_c.reshape((-1, 2, 2, 2, 1))
+
+            # Slice each cell across the reference direction in which Y(X) varies most
+            variation_1 = np.abs(Y_c[:, 1, 0] - Y_c[:, 0, 0]) + np.abs(Y_c[:, 1, 1] - Y_c[:, 0, 1])
+            variation_2 = np.abs(Y_c[:, 0, 1] - Y_c[:, 0, 0]) + np.abs(Y_c[:, 1, 1] - Y_c[:, 1, 0])
+            swap = (variation_2 > variation_1).ravel()
+            Y_c = np.where(swap[:, None, None, None], Y_c.transpose(0, 2, 1, 3), Y_c)
+            X_c = np.where(swap[:, None, None, None, None], X_c.transpose(0, 2, 1, 3, 4), X_c)
+
+            xi, w = np.polynomial.legendre.leggauss(n_slices)
+            xi, w = (xi + 1)/2, w/2
+
+            # Values at ξ1 = 0, 1 & Jacobian determinants along each slice
+            Y_0 = (1 - xi)*Y_c[:, 0, 0] + xi*Y_c[:, 0, 1]
+            Y_1 = (1 - xi)*Y_c[:, 1, 0] + xi*Y_c[:, 1, 1]
+            d_1 = (1 - xi)*(X_c[:, 1, 0] - X_c[:, 0, 0]) + xi*(X_c[:, 1, 1] - X_c[:, 0, 1])
+            J = [np.abs(d_1[:, 0]*d_2[:, 1] - d_1[:, 1]*d_2[:, 0]) for d_2 in (X_c[:, 0, 1] - X_c[:, 0, 0], X_c[:, 1, 1] - X_c[:, 1, 0])]
+
+            a, b = np.minimum(Y_0, Y_1), np.maximum(Y_0, Y_1)
+            r_0, r_1 = (w*J_i/np.maximum(b - a, 1e-300) for J_i in J)
+            increasing = Y_1 >= Y_0
+            pieces = [(a, b, np.where(increasing, r_0, r_1), np.where(increasing, r_1, r_0))]
+            mass = w*(J[0] + J[1])/2
+        else:
+            raise ValueError('Exact projections require an interval, triangle or quadrilateral mesh \n')
+
+        # Cells (or slices) where Y(X) is constant contribute a point mass
+        constant = pieces[-1][1] - a <= 1e-14
+        G = _indicator_projection(a[constant], mass[constant], self.n_e)
+        for p_a, p_b, r_a, r_b in pieces:
+            G += _linear_density_projection(p_a, p_b, np.where(constant, 0, r_a), np.where(constant, 0, r_b), self.n_e)
+
+        return self._allreduce(PartialCdf(G.ravel(), np.sum(mass)), mesh.comm)
+
+    def _allreduce(self, partial, comm):
+        """
+        Return a PartialCdf summed over the ranks of comm.
+
+        Only the n_e sized y-space result is communicated.
+
+        Parameters
+        ----------
+        partial : class 'PartialCdf'
+            The projection of I(y,X) over the part of the mesh on this rank.
+        comm : MPI communicator
+            Communicator of the mesh.
+
+        Returns
+        -------
+        partial : class 'PartialCdf'
+            The projection of I(y,X) over the whole mesh.
+        """
+        from mpi4py import MPI
+        comm.Allreduce(MPI.IN_PLACE, partial.G, op=MPI.SUM)
+        partial.measure = comm.allreduce(partial.measure, op=MPI.SUM)
+
+        return partial
+
+    def _mesh_quadrature(self, mesh, quadrature_degree):
+        """
+        Return the quadrature space and weights w_q on a mesh.
+
+        These are computed once for each mesh & quadrature degree and
+        reused by every subsequent fit.
+
+        Parameters
+        ----------
+        mesh : firedrake Mesh
+            The physical mesh m_x or the mesh of a Function.
+        quadrature_degree : int
+            Order of the quadrature scheme to use.
+
+        Returns
+        -------
+        V_Y : firedrake FunctionSpace
+            Quadrature space on mesh.
+        w_q : array-like
+            Quadrature weights.
+        """
+        key = (mesh, quadrature_degree)
+        if key not in self._physical_quadrature:
+            V_XE = FiniteElement(family="Quadrature", cell=mesh.ufl_cell(), degree=quadrature_degree, quad_scheme="default")
+            V_Y = FunctionSpace(mesh=mesh, family=V_XE)
+            w = assemble(TestFunction(V_Y)*dx(degree=quadrature_degree, scheme="default"))
+            self._physical_quadrature[key] = (V_Y, w.dat.data_ro)
+
+        return self._physical_quadrature[key]
+
+    def _partial_cdf_samples(self, Y_q, w_q):
+        """
+        Return the unnormalised projection of I(y,X) given weighted samples of Y(X).
+
+        The projection of I(y,X) onto V_F is evaluated in closed form by
+        sorting the samples once and taking prefix sums over each element.
+
+        Parameters
+        ----------
+        Y_q : array-like
+            Values Y(X_q) with range [0,1] at the quadrature points X_q.
+        w_q : array-like
+            Quadrature weights of the points X_q.
+
+        Returns
+        -------
+        partial : class 'PartialCdf'
+            The projection of I(y,X) over Ω_X & the measure of Ω_X.
+        """
+        w_q = np.asarray(w_q, dtype=float)
+        return PartialCdf(_indicator_projection(Y_q, w_q, self.n_e).ravel(), np.sum(w_q))
+
+    def _reduce(self, G, measure):
+        """
+        Return the cdf DOFs G/|Ω_X| given the unnormalised projection G of I(y,X).
+
+        In MPI mode G & the measure |Ω_X| are first summed over the ranks
+        of comm, so that only the n_e sized y-space system is communicated.
+
+        Parameters
+        ----------
+        G : array-like
+            Unnormalised projection of I(y,X) over the (local) domain Ω_X.
+        measure : float
+            Measure of the (local) domain Ω_X.
+
+        Returns
+        -------
+        F_i : array-like
+            DOFs of the cdf ordered by ascending y.
+        """
+        G = np.array(G, dtype=float)
+        if self.comm is not None:
+            from mpi4py import MPI
+            self.comm.Allreduce(MPI.IN_PLACE, G, op=MPI.SUM)
+            measure = self.comm.allreduce(measure, op=MPI.SUM)
+
+        # Checked after the reduction so every rank raises together
+        if measure <= 0:
+            raise ValueError('The PartialCdf must have a positive measure \n')
+
+        return G/measure
+
+    def _finalise_cdf(self, F_i, limiter=None, limiter_state=None):
+        """
+        Return the slope limited cdf F(y) in V_F given its DOFs.
+
+        Parameters
+        ----------
+        F_i : array-like
+            DOFs of the cdf ordered by ascending y, as on the extruded mesh.
+        limiter : string
+            Limiter to apply, defaults to that of the Ptp.
+        limiter_state : dict
+            State used to warm start the relaxation limiter.
+
+        Returns
+        -------
+        F : firedrake Function
+            The cdf F(y) of the random function Y(X).
+        """
+        # Recover F_Y(y) in V_F
+        F = Function(self.V_F)
+
+        # Pass F_i into F
+        F.dat.data[self._F_indx] = F_i[:]
+
+        # If the CDF is constant i.e F(y) = const do nothing otherwise
+        # apply the boundary conditions by extending the endpoints to 0,1
+        if np.allclose(F.dat.data[:], F.dat.data[0]) is False:
+            F.dat.data[0] = 0  # left end point
+            F.dat.data[-1] = 1  # right end point
+
+        # Apply a slope limiter to F
+        limiter = self.limiter if limiter is None else limiter
+        if limiter == 'relaxation':
+            F = self.slope_limiter(F, limiter_state)
+        elif limiter == 'isotonic':
+            F = self.isotonic_limiter(F)
+        else:
+            raise ValueError('The limiter must be relaxation or isotonic \n')
+
+        # Re-enforce
         if np.allclose(F.dat.data[:], F.dat.data[0]) is False:
             F.dat.data[0] = 0  # left end point
             F.dat.data[-1] = 1  # right end point
@@ -439,40 +1519,23 @@ class Ptp(object):
         
         Returns
         -------
-        Q : firedrake Function
+        Q : Qdf
             The qdf Q(p) of the random function Y(X).
         """
         # (1) Construct the non-uniform domain Ω_p
         # Obtain dofs F_i = F(z_i) from the CDF
-        F_i = F.dat.data[:]
+        F_i = F.dat.data_ro
 
         # We extend Ω_p to include the endpoints 0,1
         # As F(y=0) ≠ 0 & F(y=1) ≠ 1 due to numerical error
         p = np.hstack(([0], F_i, [1]))
 
-        # Make a 1D mesh whose vertices are given by the p values
-        layers = len(p[1:] - p[:-1])
-        m_p = UnitIntervalMesh(ncells=layers)
-        m_p.coordinates.dat.data[:] = p[:]
-
-        # (2) Create a function Q(p) on this mesh
-        V_Q = FunctionSpace(mesh=m_p, family=self.V_QE)
-        Q = Function(V_Q)
-
-        # (3) Extract the mesh coordinates of the CDF
-        m_y = self.V_F.mesh()
-        w = VectorFunctionSpace(m_y, self.V_F.ufl_element())
-        y_m = assemble(interpolate(m_y.coordinates, w)).dat.data
-
-        # Append the coordinates of the boundaries
-        y_l = m_y.coordinates.dat.data[0]  # left endpoint
-        y_r = m_y.coordinates.dat.data[-1]  # right endpoint
-        y_i = np.hstack(([y_l], y_m, [y_r]))
+        # (2) The coordinates of the DOFs of the CDF, each vertex appears twice,
+        # including the coordinates of the boundaries
+        y_i = np.repeat(np.linspace(self.Omega_Y['Y'][0], self.Omega_Y['Y'][1], self.n_e + 1), 2)
 
         # Assign Q(F_i) = y_i
-        Q.dat.data[:] = y_i[:]
-
-        return Q
+        return Qdf(p, y_i, comm=self.m_y.comm)
 
     def _pdf(self, F):
         """
@@ -491,37 +1554,29 @@ class Ptp(object):
             in terms of fs(y) within the elements and fs(y) at element facets.
         """
         
-        # Define trial & test functions on V_fc
-        u = TrialFunction(self.V_fc)
-        v = TestFunction(self.V_fc)
+        celldata = F.dat.data_ro.reshape((-1, 2))
 
-        # Construct the linear & bilinear forms
-        a = inner(u, v)*dx
-        L = inner(F.dx(0), v)*dx
-        
-        # Solve for fc
+        # As F is linear within each element its projection fc = P(dF/dy)
+        # onto DG0 is the slope of F in each element
+        h = (self.Omega_Y['Y'][1] - self.Omega_Y['Y'][0])/self.n_e
         fc = Function(self.V_fc)
-        solve(a == L, fc)
-
-        # Define trial & test functions on V_dirac
-        u = TrialFunction(self.V_fs)
-        v = TestFunction(self.V_fs)
-
-        # Define the variational form
-        a = inner(avg(u), avg(v))*dS + inner(u, v)*ds  # avg(v) = (v(+) + v(-))/2
-        L_internal = -(F('+')*v('+') - F('-')*v('-')) * dS
-        L_external = -((F-1)*v*ds(2) - (F-0)*v*ds(1))  # The jump at the end-points 
-        L = L_internal + L_external
-       
-        # Solve for fs
+        fc.dat.data[:] = (celldata[:, 1] - celldata[:, 0])/h
+
+        # As the facet mass matrix is diagonal fs is the jump in F at each
+        # facet, including the jumps from F = 0 and to F = 1 at the end-points
         fs = Function(self.V_fs)
-        solve(a == L, fs)
+        fs.dat.data[self._fs_indx] = np.diff(np.concatenate(([0.], celldata.ravel(), [1.])))[::2]
 
         return {"fc": fc, "fs": fs}
 
-    def _external_function(self, Y_numerical, quadrature_degree):
+    def _external_function(self, Y_numerical, quadrature_degree, start, stop):
         """
-        Return Y_numerical(x_q) at the quadrature points x_q,specified by the quadrature degree.
+        Return Y_numerical(x_q) and w_q at the quadrature points x_q with indices start:stop.
+
+        The points are generated from the tensor product rule of
+        _quadrature_rule as they are needed, so that the memory used by
+        the coordinates, the callable & its output is bounded by the
+        number of points requested whatever the quadrature degree.
 
         Parameters
         ----------
@@ -529,129 +1584,182 @@ class Ptp(object):
             Numerical representation of the function Y(x)
         quadrature_degree: int
             Order of the quadrature scheme to use.
+        start, stop: int
+            Range of the indices of the points x_q.
 
         Returns
         -------
-        Y : firedrake Function
-            Y_numerical evaluated at points x_q of a quadrature mesh.
+        Y_q, w_q : array-like
+            Values Y(x_q) and quadrature weights w_q of the points.
+        """
+        rule = self._quadrature_rule(quadrature_degree)
+        shape = tuple(len(w_i) for _, w_i in rule)
+
+        index = np.unravel_index(np.arange(start, stop), shape)
+        x_q = np.column_stack([x_i[j] for (x_i, _), j in zip(rule, index)])
+        w_q = np.prod([w_i[j] for (_, w_i), j in zip(rule, index)], axis=0)
+
+        return np.asarray(Y_numerical(x_q), dtype=float).ravel(), w_q
+
+    def _partial_cdf_callable(self, Y_numerical, quadrature_degree, chunk_size=2**18, n_threads=1):
+        """
+        Return the unnormalised projection of I(y,X) for a callable Y(X).
+
+        The callable is evaluated over chunks of the quadrature points &
+        each chunk is projected as soon as it is evaluated. Chunks may be
+        evaluated by a pool of threads, which is effective when Y_numerical
+        releases the GIL, e.g. NumPy or SciPy interpolators. The projection
+        of each chunk is written to its own row of a preallocated buffer, so
+        the result does not depend on the order in which threads finish.
+
+        Parameters
+        ----------
+        Y_numerical: callable
+            Numerical representation of the function Y(x), which must be
+            thread safe if n_threads > 1.
+        quadrature_degree: int
+            Order of the quadrature scheme to use.
+        chunk_size: int
+            Maximum number of points passed to Y_numerical at once.
+        n_threads: int
+            Number of threads over which the chunks are evaluated.
+
+        Returns
+        -------
+        partial : class 'PartialCdf'
+            The projection of I(y,X) over Ω_X & the measure of Ω_X.
+        """
+        if chunk_size < 1:
+            raise ValueError('The chunk size must be a positive integer \n')
+        if n_threads < 1:
+            raise ValueError('The number of threads must be a positive integer \n')
+
+        n_q = np.prod([len(w_i) for _, w_i in self._quadrature_rule(quadrature_degree)])
+        starts = range(0, n_q, chunk_size)
+
+        # Projection & measure of each chunk
+        G = np.zeros((len(starts), 2*self.n_e))
+        measure = np.zeros(len(starts))
+
+        def project(k):
+            Y_q, w_q = self._external_function(Y_numerical, quadrature_degree, starts[k], min(starts[k] + chunk_size, n_q))
+            G[k] = _indicator_projection(self.map(Y_q), w_q, self.n_e).ravel()
+            measure[k] = np.sum(w_q)
+
+        if n_threads == 1:
+            for k in range(len(starts)):
+                project(k)
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=n_threads) as executor:
+                list(executor.map(project, range(len(starts))))
+
+        return PartialCdf(np.sum(G, axis=0), np.sum(measure))
+
+    def _quadrature_rule(self, quadrature_degree):
         """
-        V_XE = FiniteElement(family="Quadrature", cell=self.cell_type, degree=quadrature_degree, quad_scheme="default")
-        V_YE = FiniteElement(family="DG", cell="interval", degree=0, variant="equispaced")
-        T_element = TensorProductElement(V_XE, V_YE)
-        V_Y = FunctionSpace(mesh=self.m_yx, family=T_element)
-        Y = Function(V_Y)
+        Return the composite Gauss-Legendre points and weights along each axis of Ω_X.
 
-        m = V_Y.mesh()
-        W = VectorFunctionSpace(m, V_Y.ufl_element())
-        x_vec = assemble(interpolate(m.coordinates, W))
-        x_q = x_vec.dat.data[:, :-1]
-        Y.dat.data[:] = Y_numerical(x_q)
+        The rule has (quadrature_degree + 2)//2 points per cell along each
+        axis of m_x, as the default scheme of Firedrake on intervals &
+        quadrilaterals, and is computed once for each quadrature degree.
 
-        return Y
+        Parameters
+        ----------
+        quadrature_degree: int
+            Order of the quadrature scheme to use.
 
-    def slope_limiter(self, F):
+        Returns
+        -------
+        rule : list of tuples
+            The points x_i and weights w_i of each axis x1, x2.
+        """
+        if quadrature_degree not in self._quadrature:
+            xi, w = np.polynomial.legendre.leggauss((quadrature_degree + 2)//2)
+            rule = []
+            for (a, b), n in zip(self.Omega_X.values(), self.n_cells):
+                h = (b - a)/n
+                x_c = a + h*np.arange(n)
+                rule.append(((x_c[:, None] + h*(xi + 1)/2).ravel(), np.tile(w*h/2, n)))
+            self._quadrature[quadrature_degree] = rule
+
+        return self._quadrature[quadrature_degree]
+
+    def slope_limiter(self, F, state=None):
         """
         Apply a slope limiter to ensure a non-decreasing cdf F(y).
+
+        When fitting a sequence of similar functions, e.g. successive snapshots
+        of a simulation, the limiter can be warm started by passing the same
+        dictionary as state to each call. It is updated in place with the
+        converged jumps and the correction applied to the cells, and the
+        correction is used as the starting point of the next call. The
+        number of relaxation iterations taken is stored as 'iterations'.
         
         Parameters
         ----------
         F : firedrake Function
             The cdf F(y) of the random function Y(X).
+        state : dict
+            Limiter state of a previous call, updated in place.
         
         Returns
         -------
         F : firedrake Function
             The slope limited cdf F(y) of the random function Y(X).
         """
-        def jump_condition(a_n_minus, a_n_plus, a_0_minus):
-            if a_n_plus < a_n_minus:
-                return a_n_plus-a_n_minus
-            else:
-                return min(a_n_plus, a_0_minus) - a_n_minus
-
-        def jumps(F, F_0):
-
-            celldata_0 = F_0.dat.data[:].reshape((-1, 2))
-
-            celldata_n = F.dat.data[:].reshape((-1, 2))
-            ne = celldata_n.shape[0]
-            jumps = np.zeros(ne)
-
-            # Go through the cells from left to right
-            for e in range(ne):
-
-                # (1) cell data
-                # e - 1
-                if e == 0:
-                    cell_n_em1 = np.zeros(2)
-                    cell_0_em1 = np.zeros(2)
-                else:
-                    cell_n_em1 = celldata_n[e-1, :]
-                    cell_0_em1 = celldata_0[e-1, :]
-                # e
-                cell_n_e = celldata_n[e, :]
-                cell_0_e = celldata_0[e, :]
-
-                # e + 1
-                if e == ne-1:
-                    cell_n_ep1 = np.ones(2)
-                else:
-                    cell_n_ep1 = celldata_n[e+1, :]
-                # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-
-                # (2) jumps
-                left = jump_condition(cell_n_em1[1], cell_n_e[0], cell_0_em1[1])
-                right = jump_condition(cell_n_e[1], cell_n_ep1[0], cell_0_e[1])
-                jumps[e] = min(left, right)
-                # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-
-            return jumps
-
-        F_0 = copy.deepcopy(F)
-        ne = F_0.dat.data[:].reshape((-1, 2)).shape[0]
+        celldata = F.dat.data[:].reshape((-1, 2))
+        celldata_0 = celldata.copy()
+        ne = celldata.shape[0]
+
+        # Warm start from the correction & jumps of a previous call
+        if state is None:
+            state = {}
+        correction = np.zeros(ne)
+        jo = np.zeros(ne)
+        if len(state.get("correction", [])) == ne:
+            correction[:] = state["correction"]
+            jo[:] = state["jumps"]
+            celldata[:, 0] -= correction
+            celldata[:, 1] += correction
 
         # A) Relaxation loop
         error = 1
         iter = 0
         slope = -1
-        jo = np.zeros(ne)
         alpha = 0.1
         while (error > 0.01 or slope < 0) and (iter < 10**3):
 
             # (1) Update dats
-            jn = jumps(F, F_0)
-            F.dat.data[:].reshape((-1, 2))[:, 0] -= alpha*jn
-            F.dat.data[:].reshape((-1, 2))[:, 1] += alpha*jn
+            jn = _limiter_jumps(celldata, celldata_0)
+            celldata[:, 0] -= alpha*jn
+            celldata[:, 1] += alpha*jn
+            correction += alpha*jn
 
             # (2) Error
             iter += 1
-            if np.linalg.norm(jn) == 0:
+            # The jumps decay geometrically, so stop once they are negligible
+            # rather than when they reach round-off, where a warm start saves nothing
+            if np.linalg.norm(jn) < 1e-10:
                 error = 0.
             else:
                 error = np.linalg.norm(jn - jo, 2)/np.linalg.norm(jn, 2)
             jo = jn
 
             # (3) Calculate the slope
-            slopes = F.dat.data[:].reshape((-1, 2))[:, 1] - F.dat.data[:].reshape((-1, 2))[:, 0]
+            slopes = celldata[:, 1] - celldata[:, 0]
             slope = np.min(slopes)
             if abs(slope) < 1e-12:
                 slope = 0.
 
-            # if iter % 100 == 0:
-            #     print('Iteration i=%d' % iter, ' error = ', error, 'slope =', slope, '\n')
-            #     import matplotlib.pyplot as plt
-            #     from firedrake.pyplot import plot
-            #     plot(F,num_sample_points=50)
-            #     plt.grid()
-            #     plt.show()
-
         # B) Remove remaining illegal discontinuities
-        jn = jumps(F, F_0)
-        F.dat.data[:].reshape((-1, 2))[:, 0] -= jn
-        F.dat.data[:].reshape((-1, 2))[:, 1] += jn
+        jn = _limiter_jumps(celldata, celldata_0)
+        celldata[:, 0] -= jn
+        celldata[:, 1] += jn
+        correction += jn
 
         # C) Check no negative slopes persist
-        slopes = F.dat.data[:].reshape((-1, 2))[:, 1] - F.dat.data[:].reshape((-1, 2))[:, 0]
+        slopes = celldata[:, 1] - celldata[:, 0]
         slope = np.min(slopes)
         if abs(slope) < 1e-12:
             slope = 0.
@@ -661,39 +1769,434 @@ class Ptp(object):
             from firedrake.slope_limiter import vertex_based_limiter
             Limiter = vertex_based_limiter.VertexBasedLimiter(space=self.V_F)
             Limiter.apply(field=F)
+            state.clear()
+        else:
+            state["correction"] = correction
+            state["jumps"] = jo
+        state["iterations"] = iter
             
         return F
 
-    def fit(self, Y, quadrature_degree=100):
+    def isotonic_limiter(self, F):
+        """
+        Apply a monotone projection to ensure a non-decreasing cdf F(y).
+
+        Unlike slope_limiter this limiter is not iterative. The cell means
+        are made non-decreasing by pooling adjacent violators, which
+        preserves the mass of each pooled block of cells, after which the
+        slope in each cell is reduced so that F(y) does not decrease across
+        the element facets.
+
+        Parameters
+        ----------
+        F : firedrake Function
+            The cdf F(y) of the random function Y(X).
+
+        Returns
+        -------
+        F : firedrake Function
+            The slope limited cdf F(y) of the random function Y(X).
+        """
+        celldata = F.dat.data[:].reshape((-1, 2))
+
+        # (1) Non-decreasing cell means
+        mean = np.clip(_pool_adjacent_violators(celldata.mean(axis=1)), 0, 1)
+
+        # (2) Limit the slopes, such that F(y) lies in [0,1] and the values either
+        # side of each facet do not cross its mid-point
+        gap = np.diff(np.concatenate(([-mean[0]], mean, [2 - mean[-1]])))/2
+        slope = (celldata[:, 1] - celldata[:, 0])/2
+        slope = np.clip(slope, 0, np.minimum(gap[:-1], gap[1:]))
+
+        celldata[:, 0] = mean - slope
+        celldata[:, 1] = mean + slope
+
+        return F
+
+    def fit(self, Y, quadrature_degree=None, limiter=None, limiter_state=None, chunk_size=2**18, n_threads=1, y_quadrature_degree=None, n_slices=10):
         """
         Return the Density object correspoding to Y(X).
         
         Parameters
         ----------
-        Y : UFL expression/callable
-            A UFL expression Y(X) terms of x_coords() with range Ω_Y or
-            a callable that returns Y(X_i) at the points {X_i} with range Ω_Y. 
-        Y : UFL expression/callable
-            A UFL expression Y(X) terms of x_coords() with range Ω_Y or
-            a callable that returns Y(X_i) at the points {X_i} with range Ω_Y. 
+        Y : UFL expression/callable/firedrake Function
+            A UFL expression Y(X) terms of x_coords() with range Ω_Y,
+            a callable that returns Y(X_i) at the points {X_i} with range Ω_Y
+            or a Function with range Ω_Y on its own mesh, see partial_fit.
         quadrature_degree : int
             Quadrature degree used to evaluate the projection of I(y,X).
+            Defaults to 100, or for a Function see partial_fit.
+        limiter : string
+            Limiter used to enforce a non-decreasing CDF, either 'relaxation'
+            or 'isotonic'. Defaults to the limiter of the Ptp.
+        limiter_state : dict
+            State used to warm start the relaxation limiter, see slope_limiter.
+        chunk_size : int
+            Maximum number of quadrature points at which a callable Y is
+            evaluated at once.
+        n_threads : int
+            Number of threads over which the chunks of a callable Y are
+            evaluated, which must then be thread safe.
+        y_quadrature_degree : int
+            Quadrature degree in y used to project I(y,X) for a UFL
+            expression Y, by default the projection is exact in y, or
+            for a Y containing a Function on m_yx equals quadrature_degree.
+        n_slices : int
+            Number of slices of each cell used to project a Q1 Function.
         
         Returns
         -------
         density : class 'Density'
             A Density object containing the CDF, QDF & PDF of Y(X).
         """
-               
+        return self.finalise(self.partial_fit(Y, quadrature_degree, chunk_size, n_threads, y_quadrature_degree, n_slices), limiter, limiter_state)
+
+    def partial_fit(self, Y, quadrature_degree=None, chunk_size=2**18, n_threads=1, y_quadrature_degree=None, n_slices=10):
+        """
+        Return the PartialCdf object corresponding to Y(X) on a chunk of data.
+
+        Partial cdfs of e.g. different files, subdomains or ensemble members
+        are combined by addition and converted into a Density by finalise, so
+        that the limiter, QDF & PDF are only computed once.
+
+        Parameters
+        ----------
+        Y : UFL expression/callable/firedrake Function
+            A UFL expression Y(X) terms of x_coords() with range Ω_Y,
+            a callable that returns Y(X_i) at the points {X_i} with range Ω_Y
+            or a Function with range Ω_Y on its own mesh. The projection of
+            a Function is evaluated on its own mesh & distribution, in which
+            case the Ptp must not be given a comm.
+        quadrature_degree : int
+            Quadrature degree used to evaluate the projection of I(y,X).
+            Defaults to 100. For a Function on its own mesh it defaults to
+            max(10, 2p) for a Function of degree p, as each cell is sampled.
+            As I(y,X) is discontinuous the error decreases only with the
+            number of points per cell, so this trades the resolution of the
+            level sets of Y(X) against the cost on large meshes, and should
+            be raised for coarse meshes.
+            For a P1 Function the default projection is exact, while for a
+            Q1 Function it is exact along one direction of each cell with
+            n_slices Gauss-Legendre slices across it, see _partial_cdf_linear.
+        chunk_size : int
+            Maximum number of quadrature points at which a callable Y is
+            evaluated at once.
+        n_threads : int
+            Number of threads over which the chunks of a callable Y are
+            evaluated, which must then be thread safe.
+        y_quadrature_degree : int
+            Quadrature degree in y used to project I(y,X) for a UFL
+            expression Y, by default the projection is exact in y, or
+            for a Y containing a Function on m_yx equals quadrature_degree.
+        n_slices : int
+            Number of slices of each cell used to project a Q1 Function.
+
+        Returns
+        -------
+        partial : class 'PartialCdf'
+            The unnormalised projection of I(y,X) & the measure of Ω_X.
+
+        Examples
+        --------
+        Compute the density of an ensemble one member at a time::
+
+            >>> partial = sum(ptp.partial_fit(Y_i) for Y_i in ensemble)
+            >>> density = ptp.finalise(partial)
+        """
+        if isinstance(Y, Function) and Y.function_space().mesh() is not self.m_yx:
+            # The result is already summed over the mesh, so must not be summed over comm
+            if self.comm is not None:
+                raise ValueError('A Function on its own mesh cannot be fitted by a Ptp with a comm \n')
+            element = Y.ufl_element()
+            mesh = Y.function_space().mesh()
+            linear = element.family() in ("Lagrange", "Q") and element.degree() == 1 and Y.ufl_shape == () \
+                and mesh.coordinates.ufl_element().degree() == 1 \
+                and mesh.ufl_cell().cellname() in ("interval", "triangle", "quadrilateral")
+            if quadrature_degree is None and linear:
+                return self._partial_cdf_linear(Y, n_slices)
+            if quadrature_degree is None:
+                quadrature_degree = max(10, 2*ufl.algorithms.estimate_total_polynomial_degree(Y))
+            return self._partial_cdf_function(self.map(Y), Y.function_space().mesh(), quadrature_degree)
+
+        quadrature_degree = 100 if quadrature_degree is None else quadrature_degree
         if hasattr(Y, 'dx'):
-            Y_input = Y
+            return self._partial_cdf(self.map(Y), quadrature_degree, y_quadrature_degree)
         elif isinstance(Y, Callable):
-            Y_input = self._external_function(Y, quadrature_degree)
+            return self._partial_cdf_callable(Y, quadrature_degree, chunk_size, n_threads)
         else:
             raise ValueError('Expected a UFL expression or python callable \
                              recieved ', type(Y), '\n')
+
+    def fit_samples(self, values, weights=None, limiter=None, limiter_state=None, chunk_size=2**18):
+        """
+        Return the Density object corresponding to weighted samples of Y(X).
+
+        The samples are projected directly, without generating quadrature
+        points, e.g. field values of a finite volume code with their cell
+        volumes. The arrays are read in chunks of rows, so views such as
+        np.memmap are used without being copied or loaded whole.
+
+        Parameters
+        ----------
+        values : array-like
+            Values Y(X_i) with range Ω_Y, of any shape.
+        weights : array-like
+            Weights (e.g. cell volumes) of the samples, broadcastable to the
+            shape of values. Defaults to equal weights.
+        limiter : string
+            Limiter used to enforce a non-decreasing CDF, either 'relaxation'
+            or 'isotonic'. Defaults to the limiter of the Ptp.
+        limiter_state : dict
+            State used to warm start the relaxation limiter, see slope_limiter.
+        chunk_size : int
+            Approximate number of samples projected at once.
+
+        Returns
+        -------
+        density : class 'Density'
+            A Density object containing the CDF, QDF & PDF of Y(X).
+
+        Examples
+        --------
+        Compute the density of a field stored on disk::
+
+            >>> values = np.load('snapshot.npy', mmap_mode='r')
+            >>> density = ptp.fit_samples(values, weights=volumes)
+        """
+        return self.finalise(self._partial_cdf_arrays(values, weights, chunk_size), limiter, limiter_state)
+
+    def _partial_cdf_arrays(self, values, weights=None, chunk_size=2**18):
+        """
+        Return the unnormalised projection of I(y,X) for arrays of weighted samples.
+
+        Parameters
+        ----------
+        values : array-like
+            Values Y(X_i) with range Ω_Y, of any shape.
+        weights : array-like
+            Weights of the samples, broadcastable to the shape of values.
+        chunk_size : int
+            Approximate number of samples projected at once.
+
+        Returns
+        -------
+        partial : class 'PartialCdf'
+            The projection of I(y,X) & the total weight of the samples.
+        """
+        if chunk_size < 1:
+            raise ValueError('The chunk size must be a positive integer \n')
+
+        values = np.asarray(values)
+        if values.ndim == 0:
+            values = values.reshape(1)
+        weights = np.ones(1) if weights is None else np.asarray(weights)
+        try:
+            weights = np.broadcast_to(weights, values.shape)
+        except ValueError:
+            raise ValueError('The weights must broadcast to the shape of the values \n')
+
+        # Project whole rows of the leading axis at a time
+        rows = max(1, chunk_size//max(1, int(np.prod(values.shape[1:]))))
+        partial = PartialCdf(np.zeros(2*self.n_e), 0)
+        for i in range(0, values.shape[0], rows):
+            partial += self._partial_cdf_samples(self.map(values[i:i + rows]), weights[i:i + rows])
+
+        return partial
+
+    def fit_grid(self, values, grids, kinds, limiter=None, limiter_state=None, chunk_size=2**18):
+        """
+        Return the Density object corresponding to Y(X) on the native grid of a spectral code.
+
+        The values are weighted by the quadrature rule of each grid, so the
+        number of samples is that of the simulation & no interpolation onto
+        quadrature points is required.
+
+        Parameters
+        ----------
+        values : array-like
+            Values Y(X_i) with range Ω_Y of shape (len(grids[0]), len(grids[1]), ...).
+        grids : sequence of array-like
+            The full one dimensional grid of each axis.
+        kinds : sequence of strings
+            The kind of each grid, 'fourier', 'chebyshev' (Gauss-Chebyshev
+            roots, as used by Dedalus) or 'clenshaw-curtis' (Chebyshev
+            extrema), see _grid_weights.
+        limiter : string
+            Limiter used to enforce a non-decreasing CDF, either 'relaxation'
+            or 'isotonic'. Defaults to the limiter of the Ptp.
+        limiter_state : dict
+            State used to warm start the relaxation limiter, see slope_limiter.
+        chunk_size : int
+            Approximate number of samples projected at once.
+
+        Returns
+        -------
+        density : class 'Density'
+            A Density object containing the CDF, QDF & PDF of Y(X).
+
+        Examples
+        --------
+        Compute the density of a Dedalus snapshot on a Fourier x Chebyshev grid::
+
+            >>> b = f['tasks/buoyancy']
+            >>> x, z = b.dims[1][0][:], b.dims[2][0][:]
+            >>> density = ptp.fit_grid(b[time, ...], (x, z), ('fourier', 'chebyshev'))
+        """
+        if len(grids) != len(kinds):
+            raise ValueError('A kind must be given for each grid \n')
+        if chunk_size < 1:
+            raise ValueError('The chunk size must be a positive integer \n')
+
+        w = [_grid_weights(kind, x) for kind, x in zip(kinds, grids)]
+        values = np.asarray(values)
+        if values.shape != tuple(len(w_i) for w_i in w):
+            raise ValueError('The shape of the values must match the grids \n')
+
+        # Weights of one row of the leading axis
+        w_row = np.ones(())
+        for w_i in w[1:]:
+            w_row = np.multiply.outer(w_row, w_i)
+
+        rows = max(1, chunk_size//w_row.size)
+        partial = PartialCdf(np.zeros(2*self.n_e), 0)
+        for i in range(0, values.shape[0], rows):
+            partial += self._partial_cdf_samples(self.map(values[i:i + rows]), np.multiply.outer(w[0][i:i + rows], w_row))
+
+        return self.finalise(partial, limiter, limiter_state)
+
+    def finalise(self, partial, limiter=None, limiter_state=None):
+        """
+        Return the Density object corresponding to a PartialCdf.
+
+        Parameters
+        ----------
+        partial : class 'PartialCdf'
+            The (summed) output of partial_fit.
+        limiter : string
+            Limiter used to enforce a non-decreasing CDF, either 'relaxation'
+            or 'isotonic'. Defaults to the limiter of the Ptp.
+        limiter_state : dict
+            State used to warm start the relaxation limiter, see slope_limiter.
+
+        Returns
+        -------
+        density : class 'Density'
+            A Density object containing the CDF, QDF & PDF of Y(X).
+        """
+        F_i = self._reduce(partial.G, partial.measure)
+        F = self._finalise_cdf(F_i, limiter, limiter_state)
         y = self.y_coord()
-        F = self._cdf(self.map(Y_input), quadrature_degree)
         Q = self._qdf(F)
         f = self._pdf(F)
         return Density(self, y, F, Q, f)
+
+    def fit_many(self, Ys, quadrature_degree=None, limiter=None, warm_start=False, **fit_kwargs):
+        """
+        Yield the Density objects corresponding to a sequence of functions Y(X).
+
+        The quadrature points, DOF maps & solvers of the Ptp are shared by
+        all of the fits, so that only the work which depends on each Y(X)
+        is repeated. Each density is then identical to that returned by fit.
+        Optionally the relaxation limiter of each fit is warm started from
+        that of the previous one, in which case a density also depends on
+        the snapshots before it, within the tolerance of the limiter.
+
+        Parameters
+        ----------
+        Ys : iterable of UFL expressions/callables
+            The functions Y(X), e.g. snapshots of a simulation, as accepted by fit.
+        quadrature_degree : int
+            Quadrature degree used to evaluate the projection of I(y,X), see fit.
+        limiter : string
+            Limiter used to enforce a non-decreasing CDF, either 'relaxation'
+            or 'isotonic'. Defaults to the limiter of the Ptp.
+        warm_start : bool
+            Whether to warm start the relaxation limiter.
+        **fit_kwargs
+            Further keyword arguments of fit, e.g. chunk_size, n_threads
+            or y_quadrature_degree.
+
+        Yields
+        ------
+        density : class 'Density'
+            A Density object containing the CDF, QDF & PDF of each Y(X).
+
+        Examples
+        --------
+        Compute the densities of a time series of snapshots::
+
+            >>> snapshots = (lambda X, t=t: Y_numerical(X, time=t) for t in Times)
+            >>> for density in ptp.fit_many(snapshots, quadrature_degree=500):
+            ...     density.plot('CDF')
+        """
+        limiter_state = {} if warm_start else None
+        for Y in Ys:
+            yield self.fit(Y, quadrature_degree, limiter, limiter_state, **fit_kwargs)
+
+    def fit_parallel(self, Ys, quadrature_degree=None, limiter=None, max_workers=None, mp_context='spawn', **fit_kwargs):
+        """
+        Return the Density objects corresponding to a sequence of functions Y(X).
+
+        The fits are independent of one another and are distributed across
+        a pool of processes, each of which holds its own copy of the Ptp so
+        that forms are only compiled once per process. The densities are
+        returned to this process in a compact form and in the order of Ys.
+
+        Parameters
+        ----------
+        Ys : iterable of callables
+            Picklable callables Y(X), e.g. module level functions or
+            functools.partial objects, as accepted by fit.
+        quadrature_degree : int
+            Quadrature degree used to evaluate the projection of I(y,X), see fit.
+        limiter : string
+            Limiter used to enforce a non-decreasing CDF, either 'relaxation'
+            or 'isotonic'. Defaults to the limiter of the Ptp.
+        max_workers : int
+            Number of processes, defaults to the number of CPUs.
+        mp_context : string
+            Start method of the processes.
+        **fit_kwargs
+            Further keyword arguments of fit, e.g. chunk_size, n_threads
+            or y_quadrature_degree.
+
+        Returns
+        -------
+        densities : list of class 'Density'
+            A Density object containing the CDF, QDF & PDF of each Y(X).
+
+        Examples
+        --------
+        Compute the densities of a time series of snapshots::
+
+            >>> snapshots = [functools.partial(Y_numerical, time=t) for t in Times]
+            >>> densities = ptp.fit_parallel(snapshots, quadrature_degree=500)
+        """
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        from itertools import repeat
+
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(mp_context),
+                                 initializer=_initialise_worker, initargs=(self._args,)) as executor:
+            arrays = list(executor.map(_fit_worker, Ys, repeat(quadrature_degree), repeat(limiter), repeat(fit_kwargs)))
+
+        return [Density.from_arrays(self, arrays_i) for arrays_i in arrays]
+
+    def __reduce__(self):
+        """Return the arguments required to re-create the Ptp when pickled."""
+        return (Ptp, tuple(self._args.values()))
+
+
+# Ptp of each worker process used by Ptp.fit_parallel
+_worker_ptp = None
+
+
+def _initialise_worker(args):
+    """Create the Ptp of a worker process."""
+    global _worker_ptp
+    _worker_ptp = Ptp(**args)
+
+
+def _fit_worker(Y, quadrature_degree, limiter, fit_kwargs):
+    """Fit Y(X) on a worker process & return the density as arrays."""
+    return _worker_ptp.fit(Y, quadrature_degree, limiter, **fit_kwargs).to_arrays()
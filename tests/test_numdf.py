@@ -2,7 +2,11 @@
 
 from firedrake import *
 from numdf import Ptp
+from numdf.numdf import _limiter_jumps, _grid_weights, _block_inverse
 import numpy as np
+import functools
+import pickle
+import pytest
 
 
 def test_initialise():
@@ -35,6 +39,44 @@ def test_pdf_constant():
     assert abs(integral - 1) < 1e-12
 
 
+def test_pdf_dirac():
+    """Check the PDF of Y(x1)=min(x1, 1/2) has a Dirac measure of 1/2 at y=1/2."""
+    ptp = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=4)
+    x1 = ptp.x_coords()
+
+    density = ptp.fit(Y=conditional(gt(x1, 1/2), 1/2, x1), quadrature_degree=1000)
+    assert abs(density.pdf['fs'].at(0.5) - 0.5) < 1e-3
+    assert abs(density(1) - 1) < 1e-12
+
+
+def test_pdf_integrate():
+    """Check the moments of Y(x1)=x1 using a batch of UFL and callable test functions."""
+    ptp = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=10)
+    x1 = ptp.x_coords()
+
+    density = ptp.fit(Y=x1, quadrature_degree=1000)
+    y = density.y
+    integrals = density.integrate([1, y, y**2, lambda y: y**2, lambda y: np.cos(y)])
+
+    assert np.allclose(integrals, [1, 1/2, 1/3, 1/3, np.sin(1)], atol=1e-6)
+    assert abs(density(y**2) - integrals[2]) < 1e-12
+
+
+def test_pdf_stats():
+    """Check the closed form statistics of Y(x1)=x1, a uniform density."""
+    ptp = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=10)
+    x1 = ptp.x_coords()
+
+    density = ptp.fit(Y=x1, quadrature_degree=1000)
+    stats = density.stats(order=2, quantiles=[0.1, 0.5])
+
+    assert np.allclose(stats['moments'], [1, 1/2, 1/3], atol=1e-6)
+    assert abs(stats['mean'] - 1/2) < 1e-6
+    assert abs(stats['variance'] - 1/12) < 1e-6
+    assert abs(stats['entropy']) < 1e-6
+    assert np.allclose(stats['quantiles'], [0.1, 0.5], atol=1e-6)
+
+
 def test_cdf_uniform_domain_length():
     """Check the CDF of Y(x1)=x1 is y."""
     ptp = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=5)
@@ -73,6 +115,438 @@ def test_pdf_nonuniform_domain_length():
     assert assemble(abs(fc-1)*dx) < 1e-8
 
 
+def test_cdf_callable():
+    """Check the CDF of a callable Y(x1)=x1 matches that of the UFL expression."""
+    ptp = Ptp(Omega_X={'x1': (1, 2)}, Omega_Y={'Y': (1, 2)}, n_elements=10)
+    x1 = ptp.x_coords()
+
+    density_ufl = ptp.fit(Y=x1, quadrature_degree=500)
+    density_num = ptp.fit(Y=lambda x: x[:, 0], quadrature_degree=500)
+    assert assemble(((density_num.cdf-(density_num.y-1))**2)*dx) < 1e-8
+    assert assemble(((density_num.cdf-density_ufl.cdf)**2)*dx) < 1e-8
+
+
+def test_fit_repeated():
+    """Check repeated fits on the same Ptp are independent of one another."""
+    ptp = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=5)
+    x1 = ptp.x_coords()
+
+    density_0 = ptp.fit(Y=x1, quadrature_degree=500)
+    ptp.fit(Y=0*x1, quadrature_degree=500)
+    density_1 = ptp.fit(Y=x1, quadrature_degree=500)
+
+    assert np.allclose(density_0.cdf.dat.data, density_1.cdf.dat.data)
+    assert np.allclose(density_0.pdf['fs'].dat.data, density_1.pdf['fs'].dat.data)
+
+
+def test_fit_samples_reused():
+    """Check Y(X) is sampled once per physical quadrature point & the rule is reused."""
+    ptp = Ptp(Omega_X={'x1': (0, 1), 'x2': (0, 1)}, Omega_Y={'Y': (0, 2)}, n_elements=20)
+    x1, x2 = ptp.x_coords()
+
+    n_points = []
+
+    def Y(x):
+        n_points.append(len(x))
+        return x[:, 0] + x[:, 1]
+
+    for _ in range(2):
+        ptp.fit(Y, quadrature_degree=20)
+        ptp.fit(x1 + x2, quadrature_degree=20)
+
+    assert n_points == [11**2, 11**2]
+    assert len(ptp._quadrature) == 1
+    assert len(ptp._physical_quadrature) == 1
+
+
+def test_local_solve():
+    """Check the element-local inverse mass blocks match a global solve."""
+    ptp = Ptp(Omega_X={'x1': (0, 1), 'x2': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=10, n_cells=(2, 3))
+    x1, x2, y = ptp.xy_coords()
+
+    v = TestFunction(ptp.V_F_hat)
+    L = inner(sin(3*y)*x1 + x2, v)*dx
+    F_hat = Function(ptp.V_F_hat)
+    solve(inner(TrialFunction(ptp.V_F_hat), v)*dx == L, F_hat)
+
+    F_local = ptp._local_solve("F_hat", assemble(L).dat.data_ro)
+    assert np.allclose(F_local, F_hat.dat.data_ro, rtol=0, atol=1e-10)
+
+
+def test_block_inverse():
+    """Check the inverse blocks use local indices for the rows owned by a rank."""
+    M = np.array([[2., 1.], [1., 2.]])
+    # Two blocks in the rows 4-7 of a distributed matrix
+    indptr = np.arange(0, 9, 2)
+    indices = np.array([4, 5, 4, 5, 6, 7, 6, 7])
+    data = np.concatenate([M.ravel(), 2*M.ravel()])
+
+    nodes, M_inv = _block_inverse(indptr, indices, data, offset=4)
+    assert np.array_equal(nodes, [[0, 1], [2, 3]])
+    assert np.allclose(M_inv, [np.linalg.inv(M), np.linalg.inv(2*M)])
+
+    # A rank which owns no rows
+    nodes, M_inv = _block_inverse(np.zeros(1, dtype=int), np.zeros(0, dtype=int), np.zeros(0), offset=8)
+    b = np.zeros(0)
+    x = np.empty_like(b)
+    x[nodes] = np.einsum("eij,ej->ei", M_inv, b[nodes])
+    assert x.size == 0
+
+    with pytest.raises(ValueError):
+        _block_inverse(indptr, indices, data)
+
+
+def _limiter_jumps_loop(celldata_n, celldata_0):
+    """Return the slope limiter jumps using the original per-element loop."""
+    def jump_condition(a_n_minus, a_n_plus, a_0_minus):
+        if a_n_plus < a_n_minus:
+            return a_n_plus-a_n_minus
+        else:
+            return min(a_n_plus, a_0_minus) - a_n_minus
+
+    ne = celldata_n.shape[0]
+    jumps = np.zeros(ne)
+    for e in range(ne):
+        cell_n_em1 = np.zeros(2) if e == 0 else celldata_n[e-1, :]
+        cell_0_em1 = np.zeros(2) if e == 0 else celldata_0[e-1, :]
+        cell_n_ep1 = np.ones(2) if e == ne-1 else celldata_n[e+1, :]
+        left = jump_condition(cell_n_em1[1], celldata_n[e, 0], cell_0_em1[1])
+        right = jump_condition(celldata_n[e, 1], cell_n_ep1[0], celldata_0[e, 1])
+        jumps[e] = min(left, right)
+    return jumps
+
+
+def test_limiter_jumps():
+    """Check the vectorised limiter jumps match the per-element loop on a non-monotone cdf."""
+    rng = np.random.default_rng(0)
+    celldata_0 = np.sort(rng.uniform(0, 1, 40)).reshape((-1, 2)) + rng.normal(0, 0.05, (20, 2))
+    celldata_n = celldata_0 + rng.normal(0, 0.02, (20, 2))
+
+    assert np.array_equal(_limiter_jumps(celldata_n, celldata_0), _limiter_jumps_loop(celldata_n, celldata_0))
+    assert np.array_equal(_limiter_jumps(celldata_0, celldata_0), _limiter_jumps_loop(celldata_0, celldata_0))
+
+
+def test_cdf_isotonic():
+    """Check the isotonic limiter returns a non-decreasing CDF."""
+    ptp = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=5, limiter='isotonic')
+    x1 = ptp.x_coords()
+
+    density = ptp.fit(Y=x1, quadrature_degree=1000)
+    assert assemble(((density.cdf-density.y)**2)*dx) < 1e-8
+
+    ptp = Ptp(Omega_X={'x1': (-1, 1)}, Omega_Y={'Y': (-1, 1)}, n_elements=50)
+    x1 = ptp.x_coords()
+
+    B = (tanh(1000*(x1 - 1/2)) + tanh(1000*(x1 + 1/2)))/2
+    density = ptp.fit(Y=B, quadrature_degree=1000, limiter='isotonic')
+    assert np.all(np.diff(density.cdf.dat.data) >= -1e-12)
+
+
+def test_cdf_warm_start():
+    """Check a warm started limiter reproduces the CDF of a cold start."""
+    ptp = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=50)
+    x1 = ptp.x_coords()
+
+    state = {}
+    ptp.fit(Y=x1**2, quadrature_degree=1000, limiter_state=state)
+    assert len(state['correction']) == 50
+
+    density_warm = ptp.fit(Y=0.99*x1**2, quadrature_degree=1000, limiter_state=state)
+    density_cold = ptp.fit(Y=0.99*x1**2, quadrature_degree=1000)
+    assert assemble(((density_warm.cdf-density_cold.cdf)**2)*dx) < 1e-5
+
+
+def test_cdf_warm_start_iterations():
+    """Check a warm started limiter takes fewer iterations on a sequence of similar snapshots."""
+    ptp = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=10)
+    Ys = [lambda x, a=a: a*x[:, 0]**2 for a in 1 - 1e-4*np.arange(5)]
+
+    state = {}
+    ptp.fit(Ys[0], quadrature_degree=1000, limiter_state=state)
+    for Y in Ys[1:]:
+        cold = {}
+        ptp.fit(Y, quadrature_degree=1000, limiter_state=cold)
+        ptp.fit(Y, quadrature_degree=1000, limiter_state=state)
+        assert state['iterations'] < cold['iterations']
+
+
+def test_fit_many():
+    """Check fit_many yields the same densities as repeated calls to fit."""
+    ptp = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=10)
+    Ys = [lambda x, a=a: a*x[:, 0]**2 for a in (1.0, 0.9, 0.8)]
+
+    densities = list(ptp.fit_many(iter(Ys), quadrature_degree=500, chunk_size=50, n_threads=2))
+    assert len(densities) == 3
+    for Y, density in zip(Ys, densities):
+        assert np.allclose(density.cdf.dat.data, ptp.fit(Y, quadrature_degree=500).cdf.dat.data)
+
+    # A warm start only changes the densities within the tolerance of the limiter
+    densities = list(ptp.fit_many(iter(Ys), quadrature_degree=500, warm_start=True))
+    for Y, density in zip(Ys, densities):
+        assert assemble(((density.cdf - ptp.fit(Y, quadrature_degree=500).cdf)**2)*dx) < 1e-5
+
+
+def _Y_power(x, a):
+    """Return Y(x1) = x1^a, a picklable callable for the process pool."""
+    return x[:, 0]**a
+
+
+def test_fit_parallel():
+    """Check fit_parallel returns the same densities, in order, as fit."""
+    ptp = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=10)
+    Ys = [functools.partial(_Y_power, a=a) for a in (1, 2, 3)]
+
+    densities = ptp.fit_parallel(Ys, quadrature_degree=500, max_workers=2)
+    for Y, density in zip(Ys, densities):
+        assert np.allclose(density.cdf.dat.data, ptp.fit(Y, quadrature_degree=500).cdf.dat.data)
+
+    # Keyword arguments are forwarded to fit
+    densities = ptp.fit_parallel(Ys, quadrature_degree=500, max_workers=2, chunk_size=50)
+    for Y, density in zip(Ys, densities):
+        assert np.allclose(density.cdf.dat.data, ptp.fit(Y, quadrature_degree=500).cdf.dat.data)
+
+
+def test_density_pickle():
+    """Check a Density can be pickled and restored."""
+    ptp = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=10)
+    x1 = ptp.x_coords()
+
+    density = ptp.fit(Y=x1**2, quadrature_degree=500)
+    restored = pickle.loads(pickle.dumps(density))
+
+    assert np.allclose(density.cdf.dat.data, restored.cdf.dat.data)
+    assert np.allclose(density.pdf['fs'].dat.data, restored.pdf['fs'].dat.data)
+    assert abs(density(density.y) - restored(restored.y)) < 1e-12
+
+
+def test_fit_comm():
+    """Check each rank fits its slab of Ω_X & all ranks return the global cdf."""
+    rank, size = COMM_WORLD.rank, COMM_WORLD.size
+    ptp = Ptp(Omega_X={'x1': (rank/size, (rank + 1)/size)}, Omega_Y={'Y': (0, 1)}, n_elements=10, comm=COMM_WORLD)
+    density = ptp.fit(Y=lambda x: x[:, 0]**2, quadrature_degree=50)
+
+    # Compare with a fit of the whole of Ω_X on this rank
+    ptp_serial = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=10, comm=COMM_SELF)
+    density_serial = ptp_serial.fit(Y=lambda x: x[:, 0]**2, quadrature_degree=50*size)
+
+    y = np.linspace(0.05, 0.95, 19)
+    cdf, = density.evaluate(y, functions='cdf')
+    cdf_serial, = density_serial.evaluate(y, functions='cdf')
+    assert np.allclose(cdf, cdf_serial, atol=5e-3)
+
+
+@pytest.mark.parallel(nprocs=2)
+def test_fit_comm_parallel():
+    """Check the slabs of two ranks, whose cdfs differ, are summed to the global cdf."""
+    assert COMM_WORLD.size == 2
+    test_fit_comm()
+
+
+def test_partial_fit():
+    """Check partial cdfs of two halves of Ω_X sum to the cdf of Ω_X."""
+    ptp = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=10)
+    density = ptp.fit(Y=lambda x: x[:, 0]**2, quadrature_degree=50)
+
+    ptp_l = Ptp(Omega_X={'x1': (0, 0.5)}, Omega_Y={'Y': (0, 1)}, n_elements=10)
+    ptp_r = Ptp(Omega_X={'x1': (0.5, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=10)
+    partial = sum(p.partial_fit(Y=lambda x: x[:, 0]**2, quadrature_degree=50) for p in (ptp_l, ptp_r))
+    density_merged = ptp.finalise(partial)
+
+    assert abs(partial.measure - 1) < 1e-12
+    assert np.allclose(density.cdf.dat.data, density_merged.cdf.dat.data, atol=5e-3)
+
+
+@pytest.mark.parallel(nprocs=2)
+def test_fit_distributed():
+    """Check fits over a physical mesh distributed over COMM_WORLD match a serial fit."""
+    Omega_X, Omega_Y = {'x1': (0, 1), 'x2': (0, 1)}, {'Y': (0, 2)}
+    ptp = Ptp(Omega_X=Omega_X, Omega_Y=Omega_Y, n_elements=10, n_cells=(4, 4))
+    ptp_serial = Ptp(Omega_X=Omega_X, Omega_Y=Omega_Y, n_elements=10, n_cells=(4, 4), comm=COMM_SELF)
+    assert ptp.m_x.comm.size == 2
+
+    for kwargs in ({'quadrature_degree': 20}, {'quadrature_degree': 20, 'y_quadrature_degree': 20}):
+        x1, x2 = ptp.x_coords()
+        density = ptp.fit(Y=x1**2 + x2, **kwargs)
+        x1, x2 = ptp_serial.x_coords()
+        density_serial = ptp_serial.fit(Y=x1**2 + x2, **kwargs)
+        assert np.allclose(density.cdf.dat.data_ro, density_serial.cdf.dat.data_ro, rtol=0, atol=1e-10)
+
+    # P1 Functions on a distributed & a serial mesh of their own
+    densities = []
+    for comm in (COMM_WORLD, COMM_SELF):
+        mesh = UnitSquareMesh(8, 8, comm=comm)
+        x1, x2 = SpatialCoordinate(mesh)
+        densities.append(ptp.fit(Y=Function(FunctionSpace(mesh, "CG", 1)).interpolate(x1**2 + x2)))
+    assert np.allclose(densities[0].cdf.dat.data_ro, densities[1].cdf.dat.data_ro, rtol=0, atol=1e-10)
+
+
+def test_fit_chunked():
+    """Check the cdf of a callable does not depend on the chunk size."""
+    ptp = Ptp(Omega_X={'x1': (-1, 1), 'x2': (-1, 1)}, Omega_Y={'Y': (0, 2)}, n_elements=10)
+    density = ptp.fit(Y=lambda x: x[:, 0]**2 + x[:, 1]**2, quadrature_degree=50)
+    density_chunked = ptp.fit(Y=lambda x: x[:, 0]**2 + x[:, 1]**2, quadrature_degree=50, chunk_size=100)
+
+    assert np.allclose(density.cdf.dat.data, density_chunked.cdf.dat.data)
+
+
+def test_fit_threads():
+    """Check the cdf of a callable is the same when evaluated by a thread pool."""
+    ptp = Ptp(Omega_X={'x1': (-1, 1), 'x2': (-1, 1)}, Omega_Y={'Y': (0, 2)}, n_elements=10)
+    density = ptp.fit(Y=lambda x: x[:, 0]**2 + x[:, 1]**2, quadrature_degree=50, chunk_size=100)
+    density_threads = ptp.fit(Y=lambda x: x[:, 0]**2 + x[:, 1]**2, quadrature_degree=50, chunk_size=100, n_threads=4)
+
+    assert np.allclose(density.cdf.dat.data, density_threads.cdf.dat.data, rtol=0, atol=1e-14)
+
+
+def test_fit_y_quadrature():
+    """Check the cdf projected exactly in y matches a high order y quadrature."""
+    ptp = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=10)
+    x1 = ptp.x_coords()
+
+    density = ptp.fit(Y=x1**2, quadrature_degree=200)
+    density_y = ptp.fit(Y=x1**2, quadrature_degree=200, y_quadrature_degree=200)
+
+    assert np.allclose(density.cdf.dat.data, density_y.cdf.dat.data, atol=1e-3)
+
+
+def test_fit_function_m_yx():
+    """Check a Function on the extruded mesh m_yx is fitted with the default arguments."""
+    ptp = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=10)
+    x1, _ = ptp.xy_coords()
+    Y = Function(FunctionSpace(ptp.m_yx, "CG", 1)).interpolate(x1)
+
+    density = ptp.fit(Y=Y)
+    density_ufl = ptp.fit(Y=x1)
+
+    # The indicator is discontinuous within the cells of m_yx, so is only resolved to O(1e-3)
+    assert np.allclose(density.cdf.dat.data, density_ufl.cdf.dat.data, atol=5e-3)
+
+
+def test_fit_n_cells():
+    """Check a refined physical mesh at low degree matches one cell at high degree."""
+    ptp = Ptp(Omega_X={'x1': (-1, 1), 'x2': (-1, 1)}, Omega_Y={'Y': (0, 2)}, n_elements=10)
+    ptp_refined = Ptp(Omega_X={'x1': (-1, 1), 'x2': (-1, 1)}, Omega_Y={'Y': (0, 2)}, n_elements=10, n_cells=(8, 8))
+    x1, x2 = ptp_refined.x_coords()
+
+    density = ptp.fit(Y=lambda x: x[:, 0]**2 + x[:, 1]**2, quadrature_degree=400)
+    density_refined = ptp_refined.fit(Y=lambda x: x[:, 0]**2 + x[:, 1]**2, quadrature_degree=50)
+    density_ufl = ptp_refined.fit(Y=x1**2 + x2**2, quadrature_degree=50, y_quadrature_degree=50)
+
+    assert np.allclose(density.cdf.dat.data, density_refined.cdf.dat.data, atol=1e-3)
+    assert np.allclose(density.cdf.dat.data, density_ufl.cdf.dat.data, atol=1e-2)
+
+
+def test_fit_function():
+    """Check the cdf of a Function on its own mesh matches that of a callable."""
+    ptp = Ptp(Omega_X={'x1': (0, 1), 'x2': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=10)
+    density = ptp.fit(Y=lambda x: x[:, 0]**2, quadrature_degree=100)
+
+    mesh = UnitSquareMesh(16, 16)
+    x, _ = SpatialCoordinate(mesh)
+    Y = Function(FunctionSpace(mesh, "CG", 2)).interpolate(x**2)
+    density_function = ptp.fit(Y=Y, quadrature_degree=20)
+    density_default = ptp.fit(Y=Y)
+
+    assert np.allclose(density.cdf.dat.data, density_function.cdf.dat.data, atol=1e-3)
+    assert np.allclose(density.cdf.dat.data, density_default.cdf.dat.data, atol=1e-2)
+
+    # The Function is already reduced over its mesh
+    ptp_comm = Ptp(Omega_X={'x1': (0, 1), 'x2': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=10, comm=COMM_WORLD)
+    with pytest.raises(ValueError):
+        ptp_comm.fit(Y=Y)
+
+
+def test_fit_function_exact():
+    """Check the cdf of P1 & Q1 Functions varying in one direction is exact without a quadrature degree."""
+    ptp = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=10)
+    F = Function(ptp.V_F).interpolate(ptp.y_coord())
+
+    for mesh in (UnitIntervalMesh(7), UnitSquareMesh(5, 7), UnitSquareMesh(5, 7, quadrilateral=True)):
+        for i in range(mesh.geometric_dimension()):
+            x = SpatialCoordinate(mesh)
+            Y = Function(FunctionSpace(mesh, "CG", 1)).interpolate(x[i])
+            density = ptp.fit(Y=Y)
+
+            assert np.allclose(density.cdf.dat.data, F.dat.data, rtol=0, atol=1e-12)
+
+
+def test_fit_function_bilinear():
+    """Check the projection of a bilinear Q1 Function Y = x1 x2, which is only exact along slices."""
+    ptp = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=10)
+    y = ptp.y_coord()
+    F = Function(ptp.V_F).project(y - y*ln(y), form_compiler_parameters={"quadrature_degree": 40})
+
+    mesh = UnitSquareMesh(8, 8, quadrilateral=True)
+    x = SpatialCoordinate(mesh)
+    Y = Function(FunctionSpace(mesh, "CG", 1)).interpolate(x[0]*x[1])
+    partial = ptp.partial_fit(Y=Y)
+
+    # The sum over 10 slices of each cell has an error of about 1e-5
+    assert abs(partial.measure - 1) < 1e-12
+    assert np.allclose(partial.G/partial.measure, F.dat.data_ro[ptp._F_indx], rtol=0, atol=1e-4)
+
+
+def test_fit_samples(tmp_path):
+    """Check the density of weighted samples, including those of a memory map."""
+    ptp = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=10)
+    x = (np.arange(100000) + 0.5)/100000
+    values = np.lib.format.open_memmap(tmp_path / "values.npy", mode="w+", shape=(100, 1000))
+    values[:] = x.reshape(100, 1000)**2
+
+    density = ptp.fit_samples(values, weights=1e-5, chunk_size=5000)
+    density_memory = ptp.fit_samples(np.array(values))
+
+    y = np.linspace(0.25, 0.95, 15)
+    cdf, = density.evaluate(y, functions='cdf')
+    assert np.allclose(cdf, np.sqrt(y), atol=1e-2)
+    assert np.allclose(density.cdf.dat.data, density_memory.cdf.dat.data)
+
+
+def test_fit_grid():
+    """Check the density of Y(X) = x2 sampled on a Fourier x Chebyshev grid."""
+    ptp = Ptp(Omega_X={'x1': (0, 2*np.pi), 'x2': (-1, 1)}, Omega_Y={'Y': (-1, 1)}, n_elements=10)
+    x1 = np.arange(32)*2*np.pi/32
+    x2 = np.cos((2*np.arange(256) + 1)*np.pi/512)
+    values = np.zeros((32, 1)) + x2
+
+    density = ptp.fit_grid(values, (x1, x2), ('fourier', 'chebyshev'), chunk_size=1000)
+
+    y = np.linspace(-0.9, 0.9, 19)
+    cdf, = density.evaluate(y, functions='cdf')
+    assert np.allclose(cdf, (y + 1)/2, atol=1e-3)
+
+
+def test_grid_weights():
+    """Check the spectral grid weights integrate polynomials & trigonometric polynomials exactly."""
+    a, b = -1.3, 2.1
+    for N in (2, 3, 8, 9, 17):
+        x_roots = (a + b)/2 + (b - a)/2*np.cos((2*np.arange(N) + 1)*np.pi/(2*N))
+        x_extrema = (a + b)/2 + (b - a)/2*np.cos(np.arange(N)*np.pi/(N - 1))
+        for k in range(N):
+            exact = (b**(k + 1) - a**(k + 1))/(k + 1)
+            assert abs(np.sum(_grid_weights('chebyshev', x_roots)*x_roots**k) - exact) < 1e-10*max(1, abs(exact))
+            assert abs(np.sum(_grid_weights('clenshaw-curtis', x_extrema[::-1])*x_extrema[::-1]**k) - exact) < 1e-10*max(1, abs(exact))
+
+    x = 1 + np.arange(16)*2*np.pi/16
+    assert abs(np.sum(_grid_weights('fourier', x)) - 2*np.pi) < 1e-12
+    assert abs(np.sum(_grid_weights('fourier', x)*np.cos(x)**2) - np.pi) < 1e-12
+
+
+def test_fit_grid_clenshaw_curtis():
+    """Check the density of Y(X) = x1 sampled on a Clenshaw-Curtis x Fourier grid."""
+    ptp = Ptp(Omega_X={'x1': (-1, 1), 'x2': (0, 2*np.pi)}, Omega_Y={'Y': (-1, 1)}, n_elements=10)
+    x1 = np.cos(np.arange(129)*np.pi/128)
+    x2 = np.arange(32)*2*np.pi/32
+    values = x1[:, None] + np.zeros(32)
+
+    # The extrema cluster at the ends, so equal weights would give errors of about 0.1
+    density = ptp.fit_grid(values, (x1, x2), ('clenshaw-curtis', 'fourier'), chunk_size=1000)
+
+    y = np.linspace(-0.9, 0.9, 19)
+    cdf, = density.evaluate(y, functions='cdf')
+    assert np.allclose(cdf, (y + 1)/2, atol=2e-3)
+
+
 def test_cdf_piecewise():
     """Test the CDF of a piecewise continuous function."""
     ptp = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=50)
@@ -182,6 +656,17 @@ def test_qdf_straight_line():
     assert assemble((QF-density.y)*dx) < 1e-8
 
 
+def test_qdf_evaluate():
+    """Check Q(p) = p for Y(x1) = x1 when evaluated directly and as a Function."""
+    ptp = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=5)
+    x1 = ptp.x_coords()
+
+    density = ptp.fit(Y=x1, quadrature_degree=1000)
+    p = np.linspace(0, 1, 11)
+    assert np.allclose(density.qdf(p), p, atol=1e-6)
+    assert abs(density.qdf.function().at(0.3) - 0.3) < 1e-6
+
+
 def test_qdf_piecewise():
     """Check that Q( F(x) ) - x = 0 for Y(x1) = { if x1 > 1/2: x1 else: x1/2."""
     ptp = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=50)
@@ -194,6 +679,42 @@ def test_qdf_piecewise():
     assert assemble((QF-density.y)*dx) < 1e-8
 
 
+def test_compose_exact():
+    """Check the exact composition Q(F(y)) agrees with its general evaluation."""
+    ptp = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (0, 1)}, n_elements=20)
+    x1 = ptp.x_coords()
+
+    density = ptp.fit(Y=x1**2, quadrature_degree=1000)
+    QF_exact = density.compose(density.qdf, density.cdf, quadrature_degree=100)
+    QF = density.compose(density.qdf.function(), density.cdf, quadrature_degree=100)
+
+    assert assemble(((QF_exact-QF)**2)*dx) < 1e-8
+
+
+def test_evaluate():
+    """Check the vectorised evaluation of the CDF & PDF agrees with Function.at."""
+    ptp = Ptp(Omega_X={'x1': (0, 1)}, Omega_Y={'Y': (-1, 1)}, n_elements=10)
+    x1 = ptp.x_coords()
+
+    density = ptp.fit(Y=x1**2, quadrature_degree=1000)
+    # Points which avoid the vertices of the mesh, where the CDF & PDF may be discontinuous
+    y = np.linspace(-0.99, 0.99, 8)
+    cdf_at_y, qdf_at_y, pdf_at_y = density.evaluate(y)
+
+    assert np.allclose(cdf_at_y, density.cdf.at(y))
+    assert np.allclose(pdf_at_y, density.pdf['fc'].at(y))
+    assert np.allclose(qdf_at_y, density.qdf(y))
+
+    pdf_only, = density.evaluate(y, functions=('pdf',))
+    assert np.allclose(pdf_only, pdf_at_y)
+
+    # At the vertices the CDF & PDF are right-continuous
+    y_v = np.linspace(-0.8, 0.8, 9)
+    cdf_at_v, pdf_at_v = density.evaluate(y_v, functions=('cdf', 'pdf'))
+    assert np.allclose(cdf_at_v, density.cdf.at(y_v + 1e-10))
+    assert np.allclose(pdf_at_v, density.pdf['fc'].at(y_v + 1e-10))
+
+
 def test_ape_rbc():
     """Validate the APE for RBC against its analytical value."""
     # Arrange